@@ -0,0 +1,89 @@
+import collections
+
+# --- Autoscaling del gruppo di spike server ---
+# Ogni spike server è un'istanza spenta, in avvio o accesa. Un'istanza avviata diventa disponibile
+# dopo boot_time secondi e si spegne dopo idle_timeout secondi senza job (isteresi: un job che
+# arriva prima annulla lo spegnimento), senza scendere sotto min_instances. Avvio e spegnimento sono
+# eventi programmati nella lista degli eventi futuri, non controlli ripetuti ad ogni evento.
+# Le istanze non accese hanno carico infinito nell'indice del gruppo, quindi il dispatch non le
+# sceglie; i job in overflow quando nessuna istanza è accesa aspettano in pending il primo avvio.
+# Dopo un avvio ne parte un altro solo trascorsi cooldown secondi (tranne se non ci sono istanze),
+# così un picco non fa avviare più istanze mentre la prima è ancora in avvio.
+class Autoscaler:
+    OFF = 0
+    BOOTING = 1
+    ON = 2
+
+    def __init__(self, group, events, boot_kind, idle_kind, boot_time=30.0, idle_timeout=60.0, min_instances=0, scale_up_jobs=1,
+                 cooldown=30.0):
+        n = len(group.servers)
+        self.group = group
+        self.events = events
+        self.boot_kind = boot_kind
+        self.idle_kind = idle_kind
+        self.boot_time = boot_time
+        self.idle_timeout = idle_timeout
+        self.min_instances = min(min_instances, n)
+        self.scale_up_jobs = scale_up_jobs     # Job per istanza oltre i quali se ne avvia un'altra
+        self.cooldown = cooldown
+        self._last_scale_up = float("-inf")
+        self.state = [Autoscaler.ON] * self.min_instances + [Autoscaler.OFF] * (n - self.min_instances)
+        self.instances = self.min_instances    # Istanze in avvio o accese, quelle che costano
+        self.ready = self.min_instances        # Istanze accese
+        self.pending = collections.deque()
+        self._off = list(range(n - 1, self.min_instances - 1, -1))
+        self._idle = [None] * n
+        for i in range(self.min_instances, n):
+            group.index.update(i, float("inf"))
+
+    def __len__(self):
+        return len(self.pending)
+
+    @property
+    def booting(self):
+        return self.instances - self.ready
+
+    def needs_instance(self):
+        # Regola sulla coda: nessuna istanza disponibile o in arrivo, oppure troppi job per istanza.
+        # Le istanze in avvio contano come capacità: i job in più le troveranno accese
+        if not self._off:
+            return False
+        jobs = len(self.group) + len(self.pending)
+        return self.instances == 0 or jobs >= self.scale_up_jobs * self.instances
+
+    def scale_up(self, now):
+        # Avvia un'istanza spenta, restituisce False se sono già tutte in uso o se l'ultimo avvio è
+        # di meno di cooldown secondi fa
+        if not self._off or (self.instances > 0 and now - self._last_scale_up < self.cooldown):
+            return False
+        self._last_scale_up = now
+        i = self._off.pop()
+        self.state[i] = Autoscaler.BOOTING
+        self.instances += 1
+        self.events.schedule(now + self.boot_time, self.boot_kind, i)
+        return True
+
+    def on_boot(self, i, now):
+        self.state[i] = Autoscaler.ON
+        self.ready += 1
+        self.group.index.update(i, 0)
+        self.job_done(i, now)
+
+    def job_added(self, i):
+        if self._idle[i] is not None:
+            self.events.cancel(self._idle[i])
+            self._idle[i] = None
+
+    def job_done(self, i, now):
+        # Un'istanza rimasta senza job si spegne dopo idle_timeout, se nel frattempo non ne riceve
+        if len(self.group.servers[i]) == 0 and self._idle[i] is None:
+            self._idle[i] = self.events.schedule(now + self.idle_timeout, self.idle_kind, i)
+
+    def on_idle(self, i, now):
+        self._idle[i] = None
+        if self.instances > self.min_instances and len(self.group.servers[i]) == 0:
+            self.state[i] = Autoscaler.OFF
+            self.instances -= 1
+            self.ready -= 1
+            self.group.index.update(i, float("inf"))
+            self._off.append(i)
@@ -0,0 +1,146 @@
+import numpy as np
+from ps_server import PSServer
+
+# --- Indice dei carichi di un gruppo di server ---
+# Albero dei minimi (segment tree) sul numero di job di ogni server: aggiornare il carico di un
+# server costa O(log n), trovare il server meno carico o il primo server sotto una soglia costa
+# O(log n) invece di una scansione lineare. A parità di carico vince il server di indice minore.
+class LoadIndex:
+    def __init__(self, n):
+        self.n = n
+        self._size = 1
+        while self._size < n:
+            self._size *= 2
+        self._tree = [float("inf")] * (2 * self._size)
+        for i in range(n):
+            self._tree[self._size + i] = 0
+        for pos in range(self._size - 1, 0, -1):
+            self._tree[pos] = min(self._tree[2 * pos], self._tree[2 * pos + 1])
+
+    def __len__(self):
+        return self.n
+
+    def load(self, i):
+        return self._tree[self._size + i]
+
+    def update(self, i, load):
+        pos = self._size + i
+        tree = self._tree
+        tree[pos] = load
+        pos //= 2
+        while pos:
+            tree[pos] = min(tree[2 * pos], tree[2 * pos + 1])
+            pos //= 2
+
+    def argmin(self):
+        tree = self._tree
+        pos = 1
+        while pos < self._size:
+            pos = 2 * pos if tree[2 * pos] <= tree[2 * pos + 1] else 2 * pos + 1
+        return pos - self._size
+
+    def first_below(self, limit):
+        # Server di indice minore con meno di limit job, None se sono tutti pieni
+        tree = self._tree
+        if tree[1] >= limit:
+            return None
+        pos = 1
+        while pos < self._size:
+            pos = 2 * pos if tree[2 * pos] < limit else 2 * pos + 1
+        return pos - self._size
+
+# --- Gruppo di server ---
+# Server PS dello stesso tipo (web o spike) con l'indice dei loro carichi e la politica di dispatch.
+# add() e pop() tengono aggiornati indice, job totali e numero di server occupati, e aggiornano
+# l'orologio virtuale solo del server coinvolto.
+class ServerGroup:
+    def __init__(self, jobs, n, dispatcher):
+        self.servers = [PSServer(jobs, i) for i in range(n)]
+        self.index = LoadIndex(n)
+        self.dispatcher = dispatcher
+        self.jobs_in_service = 0
+        self.busy = 0           # Server con almeno un job
+
+    def __len__(self):
+        return self.jobs_in_service
+
+    def add(self, server, job, now):
+        server.advance_to(now)
+        if len(server) == 0:
+            self.busy += 1
+        server.add(job)
+        self.jobs_in_service += 1
+        self.index.update(server.index, len(server))
+
+    def pop(self, server, now):
+        server.advance_to(now)
+        job = server.pop()
+        if len(server) == 0:
+            self.busy -= 1
+        self.jobs_in_service -= 1
+        self.index.update(server.index, len(server))
+        return job
+
+# --- Politiche di dispatch ---
+# select(index, limit) sceglie un server del gruppo e lo restituisce solo se ha meno di limit job,
+# altrimenti None (il job va in overflow al gruppo spike). Ogni gruppo di server ha la sua istanza.
+class Dispatcher:
+    def choose(self, index):
+        raise NotImplementedError
+
+    def select(self, index, limit):
+        i = self.choose(index)
+        return i if index.load(i) < limit else None
+
+class ThresholdOverflow(Dispatcher):
+    # Riempie i server in ordine fino alla soglia e manda in overflow solo quando sono tutti pieni:
+    # con un solo web server è la regola len(web) >= SI_max
+    def choose(self, index):
+        return index.argmin()
+
+    def select(self, index, limit):
+        return index.first_below(limit)
+
+class JoinShortestQueue(Dispatcher):
+    def choose(self, index):
+        return index.argmin()
+
+class PowerOfD(Dispatcher):
+    # Il meno carico tra d server estratti a caso (con reinserimento)
+    def __init__(self, d, rng, block_size=4096):
+        self.d = d
+        self._rng = rng
+        self._block_size = block_size
+        self._uniforms = []
+
+    def choose(self, index):
+        if len(self._uniforms) < self.d:
+            self._uniforms = self._rng.random(self._block_size * self.d).tolist()
+        best = None
+        for _ in range(self.d):
+            i = int(self._uniforms.pop() * len(index))
+            if best is None or index.load(i) < index.load(best):
+                best = i
+        return best
+
+class RoundRobin(Dispatcher):
+    def __init__(self):
+        self._next = 0
+
+    def choose(self, index):
+        i = self._next % len(index)
+        self._next = i + 1
+        return i
+
+DISPATCHERS = ("threshold", "jsq", "power_of_d", "round_robin")
+
+def make_dispatcher(policy, d=2, rng=None):
+    if policy == "threshold":
+        return ThresholdOverflow()
+    if policy == "jsq":
+        return JoinShortestQueue()
+    if policy == "power_of_d":
+        return PowerOfD(d, rng if rng is not None else np.random.default_rng())
+    if policy == "round_robin":
+        return RoundRobin()
+    raise ValueError(f"Politica di dispatch sconosciuta '{policy}', ammesse: {', '.join(DISPATCHERS)}")
@@ -0,0 +1,123 @@
+import bisect
+import heapq
+
+# --- Lista degli eventi futuri ---
+# Un evento ha un istante, un tipo (intero, che a parità di istante fa da priorità: tipo minore prima)
+# e un target opzionale (es. il server che completa un job). A parità di istante e tipo gli eventi
+# escono nell'ordine in cui sono stati programmati, quindi le due implementazioni producono la stessa
+# sequenza. La cancellazione è pigra: l'evento viene marcato e scartato quando arriva in testa.
+class Event:
+    __slots__ = ("time", "kind", "target", "pending")
+
+    def __init__(self, time, kind, target=None):
+        self.time = time
+        self.kind = kind
+        self.target = target
+        self.pending = True     # False dopo l'estrazione o la cancellazione
+
+class HeapEventList:
+    # Min-heap binario: inserimento ed estrazione in O(log E)
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def schedule(self, time, kind, target=None):
+        event = Event(time, kind, target)
+        heapq.heappush(self._heap, (time, kind, self._seq, event))
+        self._seq += 1
+        self._size += 1
+        return event
+
+    def cancel(self, event):
+        if event.pending:
+            event.pending = False
+            self._size -= 1
+
+    def pop(self):
+        while True:
+            event = heapq.heappop(self._heap)[3]
+            if event.pending:
+                event.pending = False
+                self._size -= 1
+                return event
+
+class CalendarQueue:
+    # Calendar queue di Brown (1988): gli eventi sono distribuiti in bucket di ampiezza width come i
+    # giorni di un calendario, il giorno k = floor(time / width) va nel bucket k mod n. L'estrazione
+    # scorre i bucket a partire dal giorno corrente, quindi costa O(1) in media se width è dell'ordine
+    # della distanza tra eventi consecutivi; n e width vengono ricalcolati quando il numero di eventi
+    # raddoppia o si dimezza.
+    MIN_BUCKETS = 2
+
+    def __init__(self, buckets=MIN_BUCKETS, width=1.0):
+        self._seq = 0
+        self._size = 0          # Eventi in attesa
+        self._entries = 0       # Elementi nei bucket, compresi gli eventi cancellati non ancora scartati
+        self._now = 0.0         # Istante dell'ultimo evento estratto, i nuovi eventi non possono precederlo
+        self._setup(buckets, width)
+
+    def __len__(self):
+        return self._size
+
+    def _setup(self, buckets, width):
+        self._buckets = [[] for _ in range(buckets)]
+        self._width = width
+        self._day = int(self._now / width)  # Giorno corrente, il bucket corrente è _day mod n
+
+    def schedule(self, time, kind, target=None):
+        event = Event(time, kind, target)
+        bisect.insort(self._buckets[int(time / self._width) % len(self._buckets)], (time, kind, self._seq, event))
+        self._seq += 1
+        self._size += 1
+        self._entries += 1
+        if self._entries > 2 * len(self._buckets):
+            self._resize(2 * len(self._buckets))
+        return event
+
+    def cancel(self, event):
+        if event.pending:
+            event.pending = False
+            self._size -= 1
+
+    def pop(self):
+        while True:
+            event = self._dequeue()[3]
+            self._now = event.time
+            self._entries -= 1
+            if self._entries < len(self._buckets) // 2 and len(self._buckets) > CalendarQueue.MIN_BUCKETS:
+                self._resize(len(self._buckets) // 2)
+            if event.pending:
+                event.pending = False
+                self._size -= 1
+                return event
+
+    def _dequeue(self):
+        buckets = self._buckets
+        n = len(buckets)
+        for day in range(self._day, self._day + n):
+            bucket = buckets[day % n]
+            if bucket and int(bucket[0][0] / self._width) <= day:
+                self._day = day
+                return bucket.pop(0)
+        # Nessun evento nel prossimo anno: salto direttamente al minimo
+        entry = min(bucket[0] for bucket in buckets if bucket)
+        self._day = int(entry[0] / self._width)
+        return buckets[self._day % n].pop(0)
+
+    def _resize(self, buckets):
+        entries = sorted(entry for bucket in self._buckets for entry in bucket if entry[3].pending)
+        # Nuova ampiezza: tre volte la distanza media tra i primi eventi, come suggerito da Brown
+        sample = [entry[0] for entry in entries[:25]]
+        gaps = [b - a for a, b in zip(sample, sample[1:])]
+        width = 3 * sum(gaps) / len(gaps) if gaps and sum(gaps) > 0 else self._width
+        self._setup(buckets, width)
+        for entry in entries:
+            self._buckets[int(entry[0] / width) % buckets].append(entry)
+        self._entries = len(entries)
+
+# Implementazioni selezionabili con Simulator.EVENT_LIST
+EVENT_LISTS = {"heap": HeapEventList, "calendar": CalendarQueue}
@@ -0,0 +1,130 @@
+import argparse
+import numpy as np
+
+# --- Traccia degli eventi di una replica ---
+# Registra per ogni evento processato istante, tipo, gruppo e indice del server, job in sistema per
+# gruppo e job coinvolto. Le righe sono tuple in una lista preallocata di capacity elementi: senza file
+# la lista è un ring buffer che tiene gli ultimi capacity eventi, con un file ogni blocco pieno viene
+# accodato al file come array strutturato (stesso formato a chunk di Sampler). Il simulatore crea una
+# traccia solo se richiesta e ogni punto di registrazione costa un solo confronto con None quando
+# è disattivata.
+class EventTrace:
+    DTYPE = np.dtype([("time", np.float64), ("kind", np.int8), ("group", np.int8), ("server", np.int32),
+                      ("n_web", np.int32), ("n_spike", np.int32), ("job", np.int64)])
+    KINDS = ("completion", "arrival", "boot", "idle_timeout", "control")  # Indici = Simulator.COMPLETION, ...
+    GROUPS = ("web", "spike")       # Indici = JobStore.WEB, JobStore.SPIKE; -1 se l'evento non riguarda un server
+
+    def __init__(self, capacity=1 << 16, path=None):
+        self.capacity = capacity
+        self.path = path
+        self.recorded = 0       # Eventi registrati in totale
+        self._rows = [None] * capacity
+        self._pos = 0
+        if path is not None:
+            open(path, "wb").close()
+
+    def record(self, time, kind, group=-1, server=-1, n_web=0, n_spike=0, job=-1):
+        self._rows[self._pos] = (time, kind, group, server, n_web, n_spike, job)
+        self._pos += 1
+        self.recorded += 1
+        if self._pos == self.capacity:
+            if self.path is not None:
+                self.flush()
+            else:
+                self._pos = 0
+
+    def flush(self):
+        # Con un file accoda le righe in attesa, senza file non fa nulla (il ring buffer resta in memoria)
+        if self.path is None or self._pos == 0:
+            return
+        with open(self.path, "ab") as f:
+            np.save(f, np.array(self._rows[:self._pos], dtype=EventTrace.DTYPE))
+        self._pos = 0
+
+    def events(self):
+        # Eventi in memoria in ordine cronologico: gli ultimi capacity senza file, quelli non ancora
+        # scritti con il file
+        if self.path is None and self.recorded >= self.capacity:
+            rows = self._rows[self._pos:] + self._rows[:self._pos]
+        else:
+            rows = self._rows[:self._pos]
+        return np.array(rows, dtype=EventTrace.DTYPE)
+
+    @staticmethod
+    def load(path):
+        chunks = []
+        with open(path, "rb") as f:
+            while f.peek(1):
+                chunks.append(np.load(f))
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=EventTrace.DTYPE)
+
+    @staticmethod
+    def format(events):
+        lines = []
+        for e in events:
+            kind = EventTrace.KINDS[e["kind"]] if 0 <= e["kind"] < len(EventTrace.KINDS) else str(e["kind"])
+            where = f"{EventTrace.GROUPS[e['group']]}[{e['server']}]" if e["group"] >= 0 else (f"server {e['server']}" if e["server"] >= 0 else "-")
+            job = f"job {e['job']}" if e["job"] >= 0 else ""
+            lines.append(f"{e['time']:16.6f}  {kind:<12} {where:<12} web={e['n_web']:<6} spike={e['n_spike']:<6} {job}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def replay(events):
+        # Ripercorre la traccia ricostruendo i job in sistema dagli arrivi e dai completamenti e la
+        # confronta con i contatori registrati (lo stato dopo ogni evento). Restituisce la lista delle
+        # incongruenze (indice, messaggio), vuota se la traccia è coerente. Una traccia da ring buffer
+        # parte a metà replica: la ricostruzione parte dai contatori del primo evento
+        problems = []
+        if len(events) == 0:
+            return problems
+        in_system = {}      # job -> gruppo, per i job arrivati dentro la traccia
+        n = [int(events[0]["n_web"]), int(events[0]["n_spike"])]
+        last_time = -np.inf
+        for i, e in enumerate(events):
+            if e["time"] < last_time:
+                problems.append((i, f"istante {e['time']} precedente all'evento prima ({last_time})"))
+            last_time = e["time"]
+            group, job = int(e["group"]), int(e["job"])
+            if i == 0:
+                if e["kind"] == 1:
+                    in_system[job] = group
+                continue
+            if e["kind"] == 1 and group >= 0:
+                in_system[job] = group
+                n[group] += 1
+            elif e["kind"] == 0:
+                if job in in_system and in_system.pop(job) != group:
+                    problems.append((i, f"job {job} completato in un gruppo diverso da quello di arrivo"))
+                n[group] -= 1
+            if n[0] != e["n_web"] or n[1] != e["n_spike"]:
+                problems.append((i, f"job in sistema ricostruiti web={n[0]} spike={n[1]}, registrati web={e['n_web']} spike={e['n_spike']}"))
+                n = [int(e["n_web"]), int(e["n_spike"])]
+        return problems
+
+def testEventTrace():
+    # Ring buffer: prima del riempimento, esattamente pieno (la posizione è tornata a 0) e dopo il giro
+    for recorded, expected in ((3, [0, 1, 2]), (4, [0, 1, 2, 3]), (6, [2, 3, 4, 5])):
+        trace = EventTrace(capacity=4)
+        for i in range(recorded):
+            trace.record(float(i), 1, 0, 0, i + 1, 0, i)
+        if trace.events()["job"].tolist() != expected:
+            print(f"ERROR - {recorded} eventi registrati: {trace.events()['job'].tolist()} invece di {expected}")
+            return False
+    print("EventTrace OK")
+    return True
+
+if __name__ == "__main__":
+    # Stampa una traccia salvata (eventualmente solo gli ultimi eventi) e la verifica con replay()
+    parser = argparse.ArgumentParser(description="Stampa e verifica una traccia degli eventi salvata da Simulator")
+    parser.add_argument("path")
+    parser.add_argument("--last", type=int, default=None, help="stampa solo gli ultimi N eventi")
+    parser.add_argument("--replay", action="store_true", help="verifica la coerenza della traccia invece di stamparla")
+    args = parser.parse_args()
+    events = EventTrace.load(args.path)
+    if args.replay:
+        problems = EventTrace.replay(events)
+        for i, message in problems:
+            print(f"evento {i} ({events[i]['time']}): {message}")
+        print(f"{len(events)} eventi, {len(problems)} incongruenze")
+    else:
+        print(EventTrace.format(events if args.last is None else events[-args.last:]))
@@ -1,10 +1,13 @@
-from rvgs import Uniform, Exponential
+from rvgs import Uniform, Exponential, RandomArray
+from functools import lru_cache
+import numpy as np
 import math
 
-def Hyperexponential(mean,cv):
+@lru_cache(maxsize=None)
+def HyperexponentialParameters(mean,cv):
   #=========================================================
-  #Returns a hyperexponentially distributed positive real number. 
-  #NOTE: use mean > 0.0 and cv > 1.0
+  #Returns (p1, m1, m2) of the balanced two-phase mixture with the
+  #given mean and cv. Cached, so repeated calls cost a dict lookup.
   #=========================================================
   #
   c = math.sqrt((cv * cv - 1.0) / (cv * cv + 1.0))
@@ -12,10 +15,40 @@ def Hyperexponential(mean,cv):
   p2 = 1.0 - p1
   m1 = mean / (2.0 * p1)
   m2 = mean / (2.0 * p2)
+  return (p1, m1, m2)
+
+def Hyperexponential(mean,cv,rng=None):
+  #=========================================================
+  #Returns a hyperexponentially distributed positive real number. 
+  #NOTE: use mean > 0.0 and cv > 1.0
+  #If rng is given (e.g. LehmerStream.random) the two uniforms are
+  #taken from it instead of the current rngs stream.
+  #=========================================================
+  #
+  p1, m1, m2 = HyperexponentialParameters(mean, cv)
+
+  if (rng is not None):
+    # Stesse formule di Uniform(0.0,1.0) ed Exponential(m)
+    r = rng()
+    m = m1 if (r < p1) else m2
+    return (-m * math.log(1.0 - rng()))
 
   r = Uniform(0.0,1.0)
 
   if (r < p1):
     return (Exponential(m1))
   else:
-    return (Exponential(m2))
\ No newline at end of file
+    return (Exponential(m2))
+
+def HyperexponentialArray(mean,cv,n,stream=None):
+  #=========================================================
+  #Returns a NumPy array of n hyperexponential variates, drawing the
+  #2n uniforms in one block in the same order as n calls to
+  #Hyperexponential() (branch uniform, then exponential uniform).
+  #=========================================================
+  #
+  p1, m1, m2 = HyperexponentialParameters(mean, cv)
+
+  u = RandomArray(2 * n, stream).reshape(n, 2)
+  m = np.where(u[:, 0] < p1, m1, m2)
+  return (-m * np.log(1.0 - u[:, 1]))
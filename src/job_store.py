@@ -0,0 +1,41 @@
+# --- Archivio dei job in colonne preallocate ---
+# Un job è l'indice di una riga: i suoi campi stanno in colonne parallele preallocate (liste Python,
+# che si indicizzano più velocemente di un array NumPy elemento per elemento). Le righe liberate dai
+# completamenti vengono riusate tramite una free-list, quindi creare e rimuovere un job costa O(1)
+# senza allocare oggetti; se tutte le righe sono occupate la capacità raddoppia.
+class JobStore:
+    WEB = 0
+    SPIKE = 1
+
+    def __init__(self, capacity=1024):
+        self.arrival_time = [0.0] * capacity
+        self.service_demand = [0.0] * capacity
+        self.server = [JobStore.WEB] * capacity
+        self._free = list(range(capacity - 1, -1, -1))    # Pila delle righe libere, la prima in cima
+
+    def __len__(self):
+        # Job presenti
+        return len(self.arrival_time) - len(self._free)
+
+    @property
+    def capacity(self):
+        return len(self.arrival_time)
+
+    def alloc(self, arrival_time, service_demand, server=WEB):
+        if not self._free:
+            self._grow()
+        job = self._free.pop()
+        self.arrival_time[job] = arrival_time
+        self.service_demand[job] = service_demand
+        self.server[job] = server
+        return job
+
+    def release(self, job):
+        self._free.append(job)
+
+    def _grow(self):
+        capacity = self.capacity
+        self.arrival_time.extend([0.0] * capacity)
+        self.service_demand.extend([0.0] * capacity)
+        self.server.extend([JobStore.WEB] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
@@ -0,0 +1,241 @@
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:     # Senza Numba il kernel resta Python puro e il Simulator usa il motore a eventi
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+# --- Kernel compilato di una replica del modello base ---
+# Un web server e uno spike server PS con la regola di overflow su SI_max, come il motore a eventi
+# di Simulator._run_replica, ma su array e scalari compilabili con Numba. Riproduce le stesse
+# operazioni in virgola mobile nello stesso ordine (orologi virtuali pigri, scelta dell'evento per
+# (istante, tipo, sequenza), aree, campionamento del tempo di risposta), quindi a parità di variate
+# restituisce esattamente gli stessi contatori. Le variate arrivano già generate negli array:
+# se un array si esaurisce il kernel termina con uno stato diverso da 0 e va richiamato con
+# array più lunghi.
+
+OK = 0
+NEED_ARRIVALS = 1
+NEED_WEB = 2
+NEED_SPIKE = 3
+
+# Posizioni dei contatori di Track nell'array restituito
+COUNTERS = ("area_node_web", "area_node_spike", "area_busy_web", "area_busy_spike", "completed_web", "completed_spike",
+            "scaling_actions", "area_spike_instances", "arr_sum", "arr_sq_sum", "arr_count",
+            "web_serv_sum", "web_serv_sq_sum", "web_serv_count", "spike_serv_sum", "spike_serv_sq_sum", "spike_serv_count")
+N_COUNTERS = len(COUNTERS)
+
+@njit(cache=True)
+def _heap_less(tag, seq, i, j):
+    return tag[i] < tag[j] or (tag[i] == tag[j] and seq[i] < seq[j])
+
+@njit(cache=True)
+def _heap_push(tag, seq, job, size, t, s, j):
+    # Min-heap su (finish tag, sequenza) in tre array paralleli, restituisce la nuova dimensione
+    i = size
+    tag[i], seq[i], job[i] = t, s, j
+    while i > 0:
+        parent = (i - 1) // 2
+        if _heap_less(tag, seq, i, parent):
+            tag[i], tag[parent] = tag[parent], tag[i]
+            seq[i], seq[parent] = seq[parent], seq[i]
+            job[i], job[parent] = job[parent], job[i]
+            i = parent
+        else:
+            break
+    return size + 1
+
+@njit(cache=True)
+def _heap_pop(tag, seq, job, size):
+    # Rimuove la radice, restituisce il job rimosso
+    top = job[0]
+    size -= 1
+    tag[0], seq[0], job[0] = tag[size], seq[size], job[size]
+    i = 0
+    while True:
+        left = 2 * i + 1
+        smallest = i
+        if left < size and _heap_less(tag, seq, left, smallest):
+            smallest = left
+        if left + 1 < size and _heap_less(tag, seq, left + 1, smallest):
+            smallest = left + 1
+        if smallest == i:
+            break
+        tag[i], tag[smallest] = tag[smallest], tag[i]
+        seq[i], seq[smallest] = seq[smallest], seq[i]
+        job[i], job[smallest] = job[smallest], job[i]
+        i = smallest
+    return top
+
+@njit(cache=True)
+def run_replica(arrivals, web_units, spike_units, web_scale, spike_scale, shared_units,
+                SI_max, start, stop, bias_phase, sampling_interval):
+    # shared_units: web e spike leggono le domande dallo stesso array in ordine di arrivo (CRN)
+    n = len(arrivals) + 1
+    counters = np.zeros(N_COUNTERS)
+    samples = np.zeros(int(stop / sampling_interval) + 2)
+    rt_web = np.zeros(n)
+    rt_spike = np.zeros(n)
+    arrival_time = np.zeros(n)
+
+    # Server PS: 0 = web, 1 = spike
+    tags = np.zeros((2, n))
+    seqs = np.zeros((2, n), dtype=np.int64)
+    heap_jobs = np.zeros((2, n), dtype=np.int64)
+    size = np.zeros(2, dtype=np.int64)
+    vt = np.zeros(2)
+    last = np.zeros(2)
+    server_seq = np.zeros(2, dtype=np.int64)
+    # Eventi in attesa: arrivo e completamento di ogni server. A parità di istante il completamento
+    # (tipo 0) precede l'arrivo (tipo 1), tra i completamenti decide la sequenza di programmazione
+    completion_time = np.zeros(2)
+    completion_seq = np.zeros(2, dtype=np.int64)
+    completion_pending = np.zeros(2, dtype=np.bool_)
+    ev_seq = 0
+
+    ai = 0
+    wi = 0
+    si = 0
+    n_jobs = 0
+    n_rt_web = 0
+    n_rt_spike = 0
+    sample = 0
+    next_sample = 0.0
+
+    if ai >= len(arrivals):
+        return NEED_ARRIVALS, counters, samples, 0, rt_web, 0, rt_spike, 0, start, ai, wi, si
+    interarrival = arrivals[ai]
+    ai += 1
+    counters[8] += interarrival
+    counters[9] += interarrival * interarrival
+    counters[10] += 1
+    arrival_at = start + interarrival
+    arrival_pending = True
+    ev_seq += 1
+    t = start
+
+    while (arrival_pending or completion_pending[0] or completion_pending[1]) and (t < stop or size[0] > 0 or size[1] > 0):
+        # Prossimo evento per (istante, tipo, sequenza)
+        kind = -1
+        best_time = 0.0
+        best_seq = 0
+        for s in range(2):
+            if completion_pending[s] and (kind == -1 or completion_time[s] < best_time or (completion_time[s] == best_time and completion_seq[s] < best_seq)):
+                kind, best_time, best_seq = s, completion_time[s], completion_seq[s]
+        if arrival_pending and (kind == -1 or arrival_at < best_time):
+            kind, best_time = 2, arrival_at
+
+        dt = best_time - t
+        n_web = size[0]
+        n_spike = size[1]
+        busy_web = 1.0 if n_web > 0 else 0.0
+        busy_spike = 1.0 if n_spike > 0 else 0.0
+
+        # Campioni del tempo di risposta cumulativo negli istanti di [t, t + dt)
+        if best_time > next_sample:
+            while next_sample < t + dt:
+                elapsed = next_sample - t
+                elapsed_track = elapsed if t >= bias_phase else 0.0
+                completed = counters[4] + counters[5]
+                area = counters[0] + counters[1] + (n_web + n_spike) * elapsed_track
+                samples[sample] = area / completed if completed > 0 else 0.0
+                sample += 1
+                next_sample = sample * sampling_interval
+                if next_sample > stop:
+                    next_sample = np.inf
+
+        if t >= bias_phase:
+            counters[0] += n_web * dt
+            counters[1] += n_spike * dt
+            if n_web > 0:
+                counters[2] += busy_web * dt
+            if n_spike > 0:
+                counters[3] += busy_spike * dt
+            counters[7] += (1 if n_spike > 0 else 0) * dt
+
+        t = best_time
+        now = t
+        if kind == 2:
+            # Arrivo: overflow allo spike server se il web server ha già SI_max job
+            s = 1 if size[0] >= SI_max else 0
+            if s == 1:
+                if shared_units:
+                    if wi >= len(spike_units):
+                        return NEED_SPIKE, counters, samples, sample, rt_web, n_rt_web, rt_spike, n_rt_spike, t, ai, wi, si
+                    demand = spike_scale * spike_units[wi]
+                    wi += 1
+                else:
+                    if si >= len(spike_units):
+                        return NEED_SPIKE, counters, samples, sample, rt_web, n_rt_web, rt_spike, n_rt_spike, t, ai, wi, si
+                    demand = spike_scale * spike_units[si]
+                    si += 1
+                counters[14] += demand
+                counters[15] += demand * demand
+                counters[16] += 1
+                if size[1] == 0:
+                    counters[6] += 1
+            else:
+                if wi >= len(web_units):
+                    return NEED_WEB, counters, samples, sample, rt_web, n_rt_web, rt_spike, n_rt_spike, t, ai, wi, si
+                demand = web_scale * web_units[wi]
+                wi += 1
+                counters[11] += demand
+                counters[12] += demand * demand
+                counters[13] += 1
+            job = n_jobs
+            n_jobs += 1
+            arrival_time[job] = now
+            if size[s] > 0:
+                vt[s] += (now - last[s]) / size[s]
+            last[s] = now
+            size[s] = _heap_push(tags[s], seqs[s], heap_jobs[s], size[s], vt[s] + demand, server_seq[s], job)
+            server_seq[s] += 1
+            completion_time[s] = now + max((tags[s][0] - vt[s]) * size[s], 0.0)
+            completion_seq[s] = ev_seq
+            completion_pending[s] = True
+            ev_seq += 1
+            if now < stop:
+                if ai >= len(arrivals):
+                    return NEED_ARRIVALS, counters, samples, sample, rt_web, n_rt_web, rt_spike, n_rt_spike, t, ai, wi, si
+                interarrival = arrivals[ai]
+                ai += 1
+                counters[8] += interarrival
+                counters[9] += interarrival * interarrival
+                counters[10] += 1
+                arrival_at = now + interarrival
+                ev_seq += 1
+            else:
+                arrival_pending = False
+        else:
+            # Completamento del job in testa al server kind
+            s = kind
+            completion_pending[s] = False
+            if size[s] > 0:
+                vt[s] += (now - last[s]) / size[s]
+            last[s] = now
+            job = _heap_pop(tags[s], seqs[s], heap_jobs[s], size[s])
+            size[s] -= 1
+            if size[s] == 0:
+                vt[s] = 0.0
+                server_seq[s] = 0
+            if now > bias_phase:
+                counters[4 + s] += 1
+                if s == 0:
+                    rt_web[n_rt_web] = now - arrival_time[job]
+                    n_rt_web += 1
+                else:
+                    rt_spike[n_rt_spike] = now - arrival_time[job]
+                    n_rt_spike += 1
+            if size[s] > 0:
+                completion_time[s] = now + max((tags[s][0] - vt[s]) * size[s], 0.0)
+                completion_seq[s] = ev_seq
+                completion_pending[s] = True
+                ev_seq += 1
+
+    return OK, counters, samples, sample, rt_web, n_rt_web, rt_spike, n_rt_spike, t, ai, wi, si
@@ -0,0 +1,51 @@
+import heapq
+
+# --- Server Processor Sharing a tempo virtuale ---
+# Invece di decrementare il lavoro rimanente di ogni job ad ogni evento, il server
+# mantiene un orologio virtuale pari al servizio ricevuto da ciascun job in servizio
+# (con n job avanza di dt / n). Ogni job entra nel min-heap con un finish tag pari a
+# orologio virtuale all'arrivo + domanda di servizio, quindi il lavoro rimanente di un
+# job è finish_tag - virtual_time. Prossimo completamento e avanzamento costano O(log N).
+# I job sono indici di un JobStore, che può essere condiviso tra più server. L'orologio avanza solo
+# quando il server viene toccato, con advance_to(), così in un gruppo di molti server ogni evento
+# aggiorna un solo orologio.
+class PSServer:
+    def __init__(self, jobs, index=0):
+        self.jobs = jobs
+        self.index = index      # Posizione nel gruppo di server
+        self.virtual_time = 0.0
+        self.last_time = 0.0    # Istante reale a cui è aggiornato l'orologio virtuale (per advance_to)
+        self._heap = []
+        self._seq = 0       # Tie-break FIFO a parità di finish tag, come min() sulla lista
+        self.completion = None  # Evento di completamento programmato nella lista degli eventi futuri
+
+    def __len__(self):
+        return len(self._heap)
+
+    def add(self, job):
+        heapq.heappush(self._heap, (self.virtual_time + self.jobs.service_demand[job], self._seq, job))
+        self._seq += 1
+
+    def peek(self):
+        # Job con il minimo lavoro rimanente, None se il server è vuoto
+        return self._heap[0][2] if self._heap else None
+
+    def time_to_next_completion(self):
+        # Con n job in servizio il job in testa completa dopo (lavoro rimanente) * n secondi
+        if not self._heap:
+            return None
+        return (self._heap[0][0] - self.virtual_time) * len(self._heap)
+
+    def advance_to(self, now):
+        # Avanzamento pigro: il numero di job è rimasto costante dall'ultimo aggiornamento
+        if self._heap:
+            self.virtual_time += (now - self.last_time) / len(self._heap)
+        self.last_time = now
+
+    def pop(self):
+        job = heapq.heappop(self._heap)[2]
+        if not self._heap:
+            # Server vuoto: riazzero l'orologio virtuale per non perdere precisione
+            self.virtual_time = 0.0
+            self._seq = 0
+        return job
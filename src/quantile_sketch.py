@@ -0,0 +1,130 @@
+import math
+import numpy as np
+
+# --- Istogramma logaritmico per i quantili dei tempi di risposta ---
+# I bin hanno estremi in progressione geometrica di ragione gamma = (1 + a) / (1 - a), quindi ogni
+# quantile è stimato con errore relativo al più a (come in DDSketch / HDR histogram) usando una
+# quantità di memoria fissa, indipendente dal numero di job. Due istogrammi con gli stessi parametri
+# si uniscono sommando i conteggi, per cui si possono unire repliche e worker senza perdere precisione.
+# I valori vengono accumulati in un piccolo buffer e inseriti nei bin a blocchi con NumPy.
+class LogHistogram:
+    def __init__(self, relative_accuracy=0.01, min_value=1e-6, max_value=1e6, buffer_size=4096):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self._offset = math.floor(math.log(min_value) / self._log_gamma)
+        size = math.ceil(math.log(max_value) / self._log_gamma) - self._offset + 1
+        self.counts = np.zeros(size, dtype=np.int64)   # Valori fuori da [min_value, max_value] finiscono nei bin estremi
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+        self._buffer_size = buffer_size
+
+    def __len__(self):
+        return self.count + len(self._buffer)
+
+    def add(self, x):
+        self._buffer.append(x)
+        if len(self._buffer) >= self._buffer_size:
+            self.flush()
+
+    def add_many(self, values):
+        # Come add() su ogni valore, con il buffer svuotato negli stessi punti
+        i = 0
+        while i < len(values):
+            room = self._buffer_size - len(self._buffer)
+            self._buffer.extend(values[i:i + room])
+            i += room
+            if len(self._buffer) >= self._buffer_size:
+                self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        values = np.array(self._buffer)
+        self._buffer = []
+        idx = np.ceil(np.log(np.clip(values, self.min_value, self.max_value)) / self._log_gamma).astype(np.int64) - self._offset
+        self.counts += np.bincount(np.clip(idx, 0, len(self.counts) - 1), minlength=len(self.counts))
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        if (other.relative_accuracy, other.min_value, other.max_value) != (self.relative_accuracy, self.min_value, self.max_value):
+            raise ValueError("Impossibile unire istogrammi con parametri diversi")
+        self.flush()
+        other.flush()
+        self.counts += other.counts
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def mean(self):
+        self.flush()
+        return self.sum / self.count if self.count > 0 else None
+
+    def quantile(self, q):
+        # Il bin k contiene (gamma^(k-1), gamma^k]: si restituisce il punto con errore relativo minimo
+        self.flush()
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        k = int(np.searchsorted(np.cumsum(self.counts), rank, side="right")) + self._offset
+        value = 2 * self.gamma ** k / (self.gamma + 1)
+        return min(max(value, self.min), self.max)
+
+    def to_dict(self):
+        # Forma serializzabile in JSON (per la cache dei risultati) con i soli bin non vuoti
+        self.flush()
+        nonzero = np.flatnonzero(self.counts)
+        first = int(nonzero[0]) if len(nonzero) else 0
+        last = int(nonzero[-1]) + 1 if len(nonzero) else 0
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "first": first,
+            "counts": self.counts[first:last].tolist(),
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count > 0 else None,
+            "max": self.max if self.count > 0 else None,
+        }
+
+    @staticmethod
+    def from_dict(data):
+        histogram = LogHistogram(data["relative_accuracy"], data["min_value"], data["max_value"])
+        histogram.counts[data["first"]:data["first"] + len(data["counts"])] = data["counts"]
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        if data["count"] > 0:
+            histogram.min, histogram.max = data["min"], data["max"]
+        return histogram
+
+def testLogHistogram():
+    # Confronto con i quantili esatti di un campione esponenziale e dell'unione di due campioni
+    rng = np.random.default_rng(1)
+    a, b = rng.exponential(2.0, 50000), rng.exponential(0.5, 50000)
+    ha, hb = LogHistogram(), LogHistogram()
+    for x in a:
+        ha.add(x)
+    for x in b:
+        hb.add(x)
+    merged = LogHistogram.from_dict(ha.to_dict()).merge(hb)
+    both = np.concatenate([a, b])
+    for q in (0.5, 0.95, 0.99):
+        for histogram, values in ((ha, a), (merged, both)):
+            exact = np.quantile(values, q, method="lower")
+            if abs(histogram.quantile(q) - exact) > histogram.relative_accuracy * exact:
+                print(f"ERROR - quantile {q}: {histogram.quantile(q)} invece di {exact}")
+                return False
+    print("LogHistogram OK")
+    return True
@@ -0,0 +1,48 @@
+import hashlib
+import json
+import sqlite3
+import threading
+
+# --- Cache su disco dei risultati delle repliche ---
+# Ogni risultato viene salvato appena la replica termina, indicizzato dall'hash della configurazione
+# del simulatore e dall'indice di replica: se uno sweep si interrompe, rilanciandolo vengono eseguite
+# solo le repliche mancanti, e sweep diversi che condividono dei punti riusano gli stessi risultati.
+class ResultCache:
+    VERSION = 1     # Da incrementare quando cambia il formato dei risultati salvati (i cambi del motore
+                    # sono in Simulator.ENGINE_VERSION, che fa parte della configurazione)
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()   # I risultati arrivano dal thread di gestione del pool
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (config TEXT, replica INTEGER, result TEXT, PRIMARY KEY (config, replica))")
+        self._conn.commit()
+
+    @staticmethod
+    def key(config):
+        return hashlib.sha256(json.dumps([ResultCache.VERSION, config], sort_keys=True).encode()).hexdigest()
+
+    def get_all(self, key):
+        # Risultati già presenti per una configurazione, come dizionario replica -> risultato
+        with self._lock:
+            rows = self._conn.execute("SELECT replica, result FROM results WHERE config = ?", (key,)).fetchall()
+        return {replica: json.loads(result) for replica, result in rows}
+
+    def put(self, key, replica, result):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)", (key, replica, json.dumps(result)))
+            self._conn.commit()
+
+    def store(self, key, replicas, future):
+        # Callback per i future del pool, salva i risultati del blocco di repliche se è terminato senza errori
+        if not future.cancelled() and future.exception() is None:
+            for replica, result in zip(replicas, future.result()[4]):
+                self.put(key, replica, result)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
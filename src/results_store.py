@@ -0,0 +1,104 @@
+import json
+import os
+import shutil
+import uuid
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:     # Senza pyarrow si usano file CSV con la stessa struttura di cartelle
+    pa = None
+
+# Tipi delle colonne di partizione, salvati accanto ai dati perché il nome delle cartelle non li conserva
+PARTITION_TYPES = {"i": "int64", "u": "int64", "f": "double", "b": "bool"}
+_CASTS = {"int64": int, "double": float, "bool": lambda value: value == "True", "string": str}
+
+# --- Archivio colonnare dei risultati degli esperimenti ---
+# Ogni esperimento è un dataset nella cartella root/<nome>, partizionato in stile Hive
+# (<colonna>=<valore>/...) sulle colonne dei parametri scelte. Le righe vengono accodate man mano
+# che le configurazioni terminano, ognuna in un nuovo file Parquet della propria partizione, e la
+# lettura carica solo le colonne richieste e solo le partizioni che soddisfano i filtri. I tipi delle
+# colonne di partizione sono salvati in _partitioning.json nella cartella del dataset.
+class ResultStore:
+    def __init__(self, root):
+        self.root = root
+        self.format = "parquet" if pa is not None else "csv"
+
+    def path(self, dataset):
+        return os.path.join(self.root, dataset)
+
+    def reset(self, dataset):
+        # Elimina un dataset prima di riscriverlo, altrimenti le nuove righe si aggiungono alle vecchie
+        shutil.rmtree(self.path(dataset), ignore_errors=True)
+
+    def append(self, dataset, rows, partition_cols=()):
+        df = rows if isinstance(rows, pd.DataFrame) else pd.DataFrame(rows)
+        if df.empty:
+            return
+        partition_cols = list(partition_cols)
+        types = {col: PARTITION_TYPES.get(df[col].dtype.kind, "string") for col in partition_cols}
+        os.makedirs(self.path(dataset), exist_ok=True)
+        if self._partitioning(dataset) != types:
+            with open(os.path.join(self.path(dataset), "_partitioning.json"), "w") as f:
+                json.dump(types, f)
+        groups = df.groupby(partition_cols, sort=False) if partition_cols else [((), df)]
+        for values, part in groups:
+            values = values if isinstance(values, tuple) else (values,)
+            directory = os.path.join(self.path(dataset), *(f"{col}={value}" for col, value in zip(partition_cols, values)))
+            os.makedirs(directory, exist_ok=True)
+            part = part.drop(columns=partition_cols)
+            name = f"part-{uuid.uuid4().hex}.{self.format}"
+            if pa is not None:
+                pq.write_table(pa.Table.from_pandas(part, preserve_index=False), os.path.join(directory, name))
+            else:
+                part.to_csv(os.path.join(directory, name), index=False)
+
+    def _partitioning(self, dataset):
+        try:
+            with open(os.path.join(self.path(dataset), "_partitioning.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def read(self, dataset, columns=None, filters=None):
+        # columns: colonne da caricare (di default tutte), filters: dizionario colonna -> valore o lista di valori
+        filters = {col: value if isinstance(value, (list, tuple, set, range)) else [value] for col, value in (filters or {}).items()}
+        types = self._partitioning(dataset) or {}
+        if pa is not None:
+            schema = pa.schema([(col, pa.type_for_alias(kind)) for col, kind in types.items()])
+            partitioning = ds.partitioning(schema, flavor="hive")
+            data = ds.dataset(self.path(dataset), format="parquet", partitioning=partitioning)
+            # Una metrica mai definita in una configurazione (es. spike mai attivo) manca dal suo file:
+            # lo schema del dataset è l'unione di quelli dei file
+            schema = pa.unify_schemas([fragment.physical_schema for fragment in data.get_fragments()] + [schema], promote_options="permissive")
+            data = ds.dataset(self.path(dataset), schema=schema, format="parquet", partitioning=partitioning)
+            expression = None
+            for col, values in filters.items():
+                condition = ds.field(col).isin(list(values))
+                expression = condition if expression is None else expression & condition
+            return data.to_table(columns=columns, filter=expression).to_pandas()
+
+        frames = []
+        for directory, _, files in os.walk(self.path(dataset)):
+            partition = {}
+            for part in os.path.relpath(directory, self.path(dataset)).split(os.sep):
+                if "=" in part:
+                    col, value = part.split("=", 1)
+                    partition[col] = _CASTS[types.get(col, "string")](value)
+            if any(col in partition and partition[col] not in values for col, values in filters.items()):
+                continue
+            for name in sorted(files):
+                if name.endswith(".csv"):
+                    usecols = None if columns is None else (lambda col: col in columns or col in filters)
+                    df = pd.read_csv(os.path.join(directory, name), usecols=usecols)
+                    for col, value in partition.items():
+                        if columns is None or col in columns:
+                            df[col] = value
+                    frames.append(df)
+        df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        for col, values in filters.items():
+            if col in df.columns:
+                df = df[df[col].isin(list(values))]
+        return df if columns is None else df[[col for col in columns if col in df.columns]]
@@ -36,6 +36,7 @@
 #  * ------------------------------------------------------------------------- 
 
 from time import time
+import numpy as np
 
 #global consts
 MODULUS = 2147483647 #/* DON'T CHANGE THIS VALUE                  */
@@ -158,7 +159,155 @@ def selectStream(index):
     
 
 
-  
+
+_powers = {}
+
+def _blockPowers(n):
+  # /* ------------------------------------------------------------------
+  #  * Returns the array [a^1, a^2, ..., a^n] mod m (a = MULTIPLIER) as
+  #  * int64, built by doubling.  Products of two values < m fit in 62 bits
+  #  * so every step is exact.  Tables are cached by size.
+  #  * ------------------------------------------------------------------
+  #  */
+  if n not in _powers:
+    p = np.array([MULTIPLIER], dtype=np.int64)
+    while (len(p) < n):
+      p = np.concatenate((p, (p * p[-1]) % MODULUS))
+    _powers[n] = p[:n]
+  return _powers[n]
+
+
+def randomBlock(n):
+  # /* ------------------------------------------------------------------
+  #  * Returns a NumPy array with the next n values of the current stream,
+  #  * bit-for-bit identical to n consecutive calls to Random(), and
+  #  * advances the state of the stream accordingly.
+  #  * The k-th state is computed directly as a^k * x0 mod m.
+  #  * ------------------------------------------------------------------
+  #  */
+  global seed
+
+  if (n <= 0):
+    return np.empty(0)
+  x = (_blockPowers(n) * seed[stream]) % MODULUS
+  seed[stream] = int(x[-1])
+  return x / MODULUS
+
+
+class StreamBuffer:
+  # /* ------------------------------------------------------------------
+  #  * Buffered iterator over a single stream: values are generated in
+  #  * blocks with randomBlock() and handed out one at a time by random().
+  #  * The sequence is the same as calling Random() on that stream, so the
+  #  * seeds planted by PlantSeeds() stay reproducible, provided every
+  #  * draw from the stream goes through the buffer.
+  #  * ------------------------------------------------------------------
+  #  */
+  def __init__(self, index, block_size=4096):
+    self.index = index % STREAMS
+    self.block_size = block_size
+    self._buffer = []
+    self._pos = 0
+
+  def _refill(self):
+    global stream
+    s = stream                           #/* remember the current stream */
+    selectStream(self.index)
+    self._buffer = randomBlock(self.block_size).tolist()
+    stream = s                           #/* reset the current stream    */
+    self._pos = 0
+
+  def random(self):
+    if (self._pos >= len(self._buffer)):
+      self._refill()
+    u = self._buffer[self._pos]
+    self._pos += 1
+    return u
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.random()
+
+
+class LehmerStream:
+  # /* ------------------------------------------------------------------
+  #  * Independent Lehmer stream that owns its state, as an alternative to
+  #  * the module-level seed[]/stream pair.  No SelectStream() is needed
+  #  * before drawing and separate objects never interfere, so each thread
+  #  * (or each role in a simulation) can hold its own stream.
+  #  *
+  #  * LehmerStream(x, index) starts in the same state as stream 'index'
+  #  * after PlantSeeds(x), i.e. x * A256^index mod m, computed directly by
+  #  * modular exponentiation.  jump(k) skips k values and jumpStreams(k)
+  #  * skips k planted offsets (k * 8,367,782 values).
+  #  * Values are generated in blocks of block_size and handed out by
+  #  * random(); the sequence is identical to Random() on that stream.
+  #  * ------------------------------------------------------------------
+  #  */
+  def __init__(self, x=DEFAULT, index=0, block_size=4096):
+    if (x < 0):
+      x = time()
+    x = int(x) % MODULUS
+    if (x == 0):
+      raise ValueError("LehmerStream seed must be 0 < x < MODULUS")
+    self.index = index % STREAMS
+    self.block_size = block_size
+    self._state = (x * pow(A256, self.index, MODULUS)) % MODULUS
+    self._states = None
+    self._buffer = []
+    self._pos = 0
+
+  def getSeed(self):
+    # /* state of the last value returned, as GetSeed() */
+    if (self._pos > 0):
+      return int(self._states[self._pos - 1])
+    return self._state
+
+  def putSeed(self, x):
+    self._state = int(x) % MODULUS
+    self._buffer = []
+    self._pos = 0
+
+  def jump(self, steps):
+    # /* advance the state by 'steps' values: x * a^steps mod m */
+    self.putSeed((self.getSeed() * pow(MULTIPLIER, steps, MODULUS)) % MODULUS)
+
+  def jumpStreams(self, k):
+    # /* advance the state by k planted offsets: x * A256^k mod m */
+    self.putSeed((self.getSeed() * pow(A256, k, MODULUS)) % MODULUS)
+    self.index = (self.index + k) % STREAMS
+
+  def _refill(self):
+    self._states = (_blockPowers(self.block_size) * self._state) % MODULUS
+    self._state = int(self._states[-1])
+    self._buffer = (self._states / MODULUS).tolist()
+    self._pos = 0
+
+  def random(self):
+    if (self._pos >= len(self._buffer)):
+      self._refill()
+    u = self._buffer[self._pos]
+    self._pos += 1
+    return u
+
+  def randomBlock(self, n):
+    # /* next n values as a NumPy array, consistent with random() */
+    self.putSeed(self.getSeed())           #/* drop buffered values */
+    if (n <= 0):
+      return np.empty(0)
+    x = (_blockPowers(n) * self._state) % MODULUS
+    self._state = int(x[-1])
+    return x / MODULUS
+
+  def __iter__(self):
+    return self
+
+  def __next__(self):
+    return self.random()
+
+
 def testRandom():
   # /* -------------------------------------------------------------------
   #  * Use this (optional) procedure to test for a correct implementation.
@@ -183,4 +332,36 @@ def testRandom():
   else:
     print("\n ERROR - the implementation of Rngs.py is not correct")
 
-  
+
+def testRandomBlock():
+  # /* -------------------------------------------------------------------
+  #  * Use this (optional) procedure to check that randomBlock() and
+  #  * StreamBuffer reproduce exactly the sequence of Random().
+  #  * -------------------------------------------------------------------
+  #  */
+  plantSeeds(DEFAULT)
+  selectStream(3)
+  expected = [random() for i in range(0,10000)]
+  state = getSeed()
+
+  plantSeeds(DEFAULT)
+  selectStream(3)
+  block = randomBlock(10000)
+  ok = (block.tolist() == expected) and (getSeed() == state)
+
+  plantSeeds(DEFAULT)
+  buf = StreamBuffer(3, block_size=1000)
+  ok = ok and ([buf.random() for i in range(0,10000)] == expected)
+
+  ls = LehmerStream(DEFAULT, 3, block_size=1000)
+  ok = ok and ([ls.random() for i in range(0,5000)] == expected[:5000])
+  ok = ok and (ls.randomBlock(5000).tolist() == expected[5000:]) and (ls.getSeed() == state)
+
+  ls = LehmerStream(DEFAULT, 0)
+  ls.jumpStreams(3)
+  ls.jump(4999)
+  ok = ok and (ls.random() == expected[4999])
+  if (ok==True):
+    print("\n The implementation of randomBlock, StreamBuffer and LehmerStream is correct")
+  else:
+    print("\n ERROR - randomBlock, StreamBuffer or LehmerStream is not correct")
@@ -1,4 +1,8 @@
 from sim import Simulator
+from sweep import grid, sweep
+from result_cache import ResultCache
+from results_store import ResultStore
+from quantile_sketch import LogHistogram
 import pandas as pd
 import time
 import logging
@@ -18,130 +22,129 @@ def compose_row(params, stats):
     }
     stats.pop("transient_response_times", None)  # Rimuovo i transient response times se presenti
     for metric, w in stats.items():
+        if metric.startswith("series_"):
+            continue    # Serie campionate, una statistica per istante
+        if isinstance(w, LogHistogram):
+            # Quantili dei tempi di risposta di tutti i job di tutte le repliche
+            for q in Simulator.QUANTILES:
+                row[f"{metric[:-len('_histogram')]}_P{round(100 * q)}"] = w.quantile(q)
+            continue
         row[f"{metric}_Mean"] = w.mean
         row[f"{metric}_Variance"] = w.variance
         row[f"{metric}_CI95"] = w.confidence_interval_95()
     return row
 
-def experiments(simulator : Simulator, stress_test=False, spike_server_enhanced=False):
-    buffer = []
-    for si_max in range(10, 170, 10):  # Da 10 a 160 con step di 10
-        simulator.SI_max = si_max
-        if stress_test:
-            for arrival_rate in range(1, 13):  # Da 1 req/s a 12 req/s
-                simulator.arrival_mean = 1.0 / arrival_rate
-                if spike_server_enhanced:
-                    simulator.spike_mean = 0.5 * simulator.spike_mean  # Potenziamento del doppio
-                logging.info(f"Eseguendo esperimento di stress test con SI_max = {si_max} e arrival rate = {arrival_rate} req/s e spike server potenziato: {spike_server_enhanced}")
-                params, stats = simulator.run()
-                row = compose_row(params, stats)
-                buffer.append(row)
-                simulator.reset()
-        else:
-            logging.info(f"Eseguendo esperimento base con SI_max = {si_max}")
-            params, stats = simulator.run()
-            row = compose_row(params, stats)
-            buffer.append(row)
-            simulator.reset()
-    df = pd.DataFrame(buffer)
-    return df
-
-def transient(simulator : Simulator, SI_max_list, arrival_rate_list):
+def transient_rows(point, stats):
+    # Una riga per ogni istante di campionamento del tempo di risposta transitorio
+    rows = []
+    transient_times = stats.pop("transient_response_times", None)
+    series = {metric[len("series_"):]: stats.pop(metric) for metric in list(stats) if metric.startswith("series_")}
+    if transient_times is not None:
+        for idx, w in enumerate(transient_times):
+            t = idx * Simulator.SAMPLING_INTERVAL
+            row = {
+                "Seed": point.get("seed"),
+                "SI_max": point["SI_max"],
+                "Arrival_Rate": point["arrival_rate"],
+                "Time": t,
+                "Transient_Response_Time_Mean": w.mean,
+                "Transient_Response_Time_Variance": w.variance,
+                "Transient_Response_Time_CI95": w.confidence_interval_95()
+            }
+            for name, w_series in series.items():
+                # Altre serie di Simulator.SAMPLED_SERIES, campionate negli stessi istanti
+                if idx < len(w_series):
+                    row[f"{name}_Mean"] = w_series[idx].mean
+                    row[f"{name}_CI95"] = w_series[idx].confidence_interval_95()
+            if "seed" not in point:
+                row.pop("Seed")
+            rows.append(row)
+    return rows
+
+def collect_rows(results, to_rows, store=None, dataset=None, partition_cols=()):
+    # Righe di tutti i punti di uno sweep; con uno store vengono anche salvate appena ogni punto termina
+    if store is not None:
+        store.reset(dataset)
     buffer = []
+    for point, params, stats in results:
+        rows = to_rows(point, params, stats)
+        if store is not None:
+            store.append(dataset, rows, partition_cols)
+        buffer.extend(rows)
+    return pd.DataFrame(buffer)
+
+def experiments(simulator : Simulator, stress_test=False, spike_server_enhanced=False, crn=False, store=None, dataset="experiment_si_max"):
+    # Con crn=True ogni replica rigioca la stessa traccia di arrivi e servizi per tutti i valori di SI_max
+    simulator.CRN = crn
+    axes = {"SI_max": range(10, 170, 10)}  # Da 10 a 160 con step di 10
+    if stress_test:
+        axes["arrival_rate"] = range(1, 13)  # Da 1 req/s a 12 req/s
+        if spike_server_enhanced:
+            axes["spike_mean"] = [0.5 * simulator.spike_mean]  # Potenziamento del doppio
+    logging.info(f"Eseguendo esperimento {'di stress test' if stress_test else 'base'} con spike server potenziato: {spike_server_enhanced}")
+    results = sweep(simulator, grid(**axes))
+    return collect_rows(results, lambda point, params, stats: [compose_row(params, stats)], store, dataset, ["Arrival_Rate"])
+
+def transient(simulator : Simulator, SI_max_list, arrival_rate_list, store=None, dataset="experiment_transient_response_time"):
     simulator.BIAS_PHASE = 0.0 
-    for si_max in SI_max_list:
-        simulator.SI_max = si_max
-        for arrival_rate in arrival_rate_list:
-            simulator.arrival_mean = 1.0 / arrival_rate
-            logging.info(f"Eseguendo esperimento transitorio con SI_max = {si_max} e arrival rate = {arrival_rate} req/s")
-            params, stats = simulator.run()
-            transient_times = stats.pop("transient_response_times", None)
-            if transient_times is not None:
-                for idx, w in enumerate(transient_times):
-                    t = idx * Simulator.SAMPLING_INTERVAL
-                    row = {
-                        "SI_max": si_max,
-                        "Arrival_Rate": arrival_rate,
-                        "Time": t,
-                        "Transient_Response_Time_Mean": w.mean,
-                        "Transient_Response_Time_Variance": w.variance,
-                        "Transient_Response_Time_CI95": w.confidence_interval_95()
-                    }
-                    buffer.append(row)
-            simulator.reset()
-    df = pd.DataFrame(buffer)
-    return df
-
-def transient_with_different_seeds(simulator : Simulator, SI_max_list, arrival_rate_list, seeds):
-    buffer = []
+    logging.info(f"Eseguendo esperimento transitorio con SI_max in {SI_max_list} e arrival rate in {arrival_rate_list} req/s")
+    results = sweep(simulator, grid(SI_max=SI_max_list, arrival_rate=arrival_rate_list))
+    return collect_rows(results, lambda point, params, stats: transient_rows(point, stats), store, dataset, ["SI_max", "Arrival_Rate"])
+
+def transient_with_different_seeds(simulator : Simulator, SI_max_list, arrival_rate_list, seeds, store=None, dataset="experiment_transient_response_time_seeds"):
     simulator.REPLICAS = 1
-    simulator.N_PROCESSES = 1
     simulator.BIAS_PHASE = 0.0 
-    for seed in seeds:
-        simulator.seed=seed
-        for si_max in SI_max_list:
-            simulator.SI_max = si_max
-            for arrival_rate in arrival_rate_list:
-                simulator.arrival_mean = 1.0 / arrival_rate
-                logging.info(f"Eseguendo esperimento transitorio con SI_max = {si_max}, arrival rate = {arrival_rate} req/s e seed = {seed}")
-                params, stats = simulator.run()
-                transient_times = stats.pop("transient_response_times", None)
-                if transient_times is not None:
-                    for idx, w in enumerate(transient_times):
-                        t = idx * Simulator.SAMPLING_INTERVAL
-                        row = {
-                            "Seed": seed,
-                            "SI_max": si_max,
-                            "Arrival_Rate": arrival_rate,
-                            "Time": t,
-                            "Transient_Response_Time_Mean": w.mean,
-                            "Transient_Response_Time_Variance": w.variance,
-                            "Transient_Response_Time_CI95": w.confidence_interval_95()
-                        }
-                        buffer.append(row)
-                simulator.reset()
-    df = pd.DataFrame(buffer)
-    return df
+    logging.info(f"Eseguendo esperimento transitorio con SI_max in {SI_max_list}, arrival rate in {arrival_rate_list} req/s e seed in {seeds}")
+    results = sweep(simulator, grid(seed=seeds, SI_max=SI_max_list, arrival_rate=arrival_rate_list))
+    return collect_rows(results, lambda point, params, stats: transient_rows(point, stats), store, dataset, ["SI_max", "Arrival_Rate", "Seed"])
 
 if __name__ == "__main__":
+    # I risultati di ogni replica vengono salvati man mano: se uno sweep si interrompe, rilanciandolo
+    # si riparte dalle repliche mancanti, e i punti in comune tra esperimenti non vengono ricalcolati
+    Simulator.RESULT_CACHE = ResultCache("src/data/results_cache.sqlite")
+    # Le serie transitorie arrivano al processo principale tramite memoria condivisa, senza serializzarle
+    Simulator.SHARED_TRANSIENT = True
+    # Risultati in formato colonnare (Parquet se pyarrow è installato), partizionati per parametri e
+    # scritti man mano che le configurazioni terminano; si rileggono con store.read(nome, colonne)
+    store = ResultStore("src/data/results")
     sim = Simulator()
 
     # start_time = time.time()
     # # Esperimento con SI_max variabile tra 10 e 160 per capire il migliore
-    # df1 = experiments(simulator=sim)
+    # df1 = experiments(simulator=sim, store=store, dataset="experiment_si_max")
     # end_time = time.time()
     # logging.info("Esperimenti completati in %.2f secondi.", end_time - start_time)
-    # df1.to_csv("src/data/experiment_si_max.csv", index=False)
 
     # start_time = time.time()
     # # Stress test con carico crescente variando sia SI_max tra 10 e 160 che l'arrival rate da 1 req/s a 12 req/s
-    # df2 = experiments(simulator=sim, stress_test=True)
+    # df2 = experiments(simulator=sim, stress_test=True, store=store, dataset="experiment_stress_test")
     # end_time = time.time()
     # logging.info("Esperimenti di stress test completati in %.2f secondi.", end_time - start_time)
-    # df2.to_csv("src/data/experiment_stress_test.csv", index=False)
 
     # start_time = time.time()
     # # Stesso espermento dello stress test ma con spike server potenziato del doppio
-    # df3 = experiments(simulator=sim, stress_test=True, spike_server_enhanced=True)
+    # df3 = experiments(simulator=sim, stress_test=True, spike_server_enhanced=True, store=store, dataset="experiment_stress_test_enhanced_spike")
     # end_time = time.time()
     # logging.info("Esperimenti di stress test con spike server potenziato completati in %.2f secondi.", end_time - start_time)
-    # df3.to_csv("src/data/experiment_stress_test_enhanced_spike.csv", index=False)
+
+    # start_time = time.time()
+    # # Stesso esperimento con Common Random Numbers: le differenze tra valori di SI_max hanno varianza ridotta
+    # df5 = experiments(simulator=sim, crn=True, store=store, dataset="experiment_si_max_crn")
+    # end_time = time.time()
+    # logging.info("Esperimenti con CRN completati in %.2f secondi.", end_time - start_time)
 
     # Esperimento con SI_max fisso a 100 e arrival rate fisso a 6 req/s, variando il coefficiente di variazione CV
-    # df = experiments(simulator=sim, stress_test=True)
-    # df.to_csv("src/data/experiment_inf_si_max.csv", index=False)
+    # df = experiments(simulator=sim, stress_test=True, store=store, dataset="experiment_inf_si_max")
 
     # start_time = time.time()
     # # Esperimento transitorio per osservare l'andamento del tempo di risposta nel tempo
-    # df4 = transient(simulator=sim, SI_max_list=[80], arrival_rate_list=[6.66])
+    # df4 = transient(simulator=sim, SI_max_list=[80], arrival_rate_list=[6.66], store=store, dataset="experiment_transient_response_time_obj1")
     # end_time = time.time()
     # logging.info("Esperimenti transitori completati in %.2f secondi.", end_time - start_time)
-    # df4.to_csv("src/data/experiment_transient_response_time_obj1.csv", index=False)
 
     start_time = time.time()
     # Esperimento transitorio per osservare l'andamento del tempo di risposta nel tempo
-    df4 = transient_with_different_seeds(simulator=sim, SI_max_list=[80], arrival_rate_list=[3, 6, 9, 12], seeds=[8, 9, 10, 11, 12, 13, 14])
+    df4 = transient_with_different_seeds(simulator=sim, SI_max_list=[80], arrival_rate_list=[3, 6, 9, 12], seeds=[8, 9, 10, 11, 12, 13, 14], store=store, dataset="experiment_transient_response_time_seeds_arrival_rate")
     end_time = time.time()
     logging.info("Esperimenti transitori completati in %.2f secondi.", end_time - start_time)
-    df4.to_csv("src/data/experiment_transient_response_time_seeds_arrival_rate.csv", index=False)
 
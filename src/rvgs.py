@@ -36,8 +36,9 @@
  # 
  #--------------------------------------------------------------------------
 
-from rngs import random
+from rngs import random, randomBlock
 from math import log,sqrt,exp
+import numpy as np
 
 def Bernoulli(p):
   #========================================================
@@ -203,6 +204,87 @@ def Student(n):
   #
   return (Normal(0.0, 1.0) / sqrt(Chisquare(n) / n))
 
+#--------------------------------------------------------------------------
+ #Array versions of the generators above.  Each one takes the number of
+ #variates n and an optional stream (e.g. rngs.LehmerStream); the uniforms
+ #are drawn in one block from the stream, or from the current rngs stream
+ #when stream is None.  Variates consume the uniforms in the same order as
+ #n calls to the scalar generator, so the values agree with it up to the
+ #last bit of NumPy's log/exp.
+ #--------------------------------------------------------------------------
+
+def RandomArray(n, stream=None):
+  #Returns n uniforms in (0,1), the block every array generator draws from
+  if (stream is None):
+    return randomBlock(n)
+  return stream.randomBlock(n)
+
+def BernoulliArray(p,n,stream=None):
+  return (RandomArray(n, stream) >= 1 - p).astype(np.int64)
+
+def EquilikelyArray(a,b,n,stream=None):
+  return a + ((b - a + 1) * RandomArray(n, stream)).astype(np.int64)
+
+def GeometricArray(p,n,stream=None):
+  return (np.log(1.0 - RandomArray(n, stream)) / log(p)).astype(np.int64)
+
+def UniformArray(a,b,n,stream=None):
+  return (a + (b - a) * RandomArray(n, stream))
+
+def ExponentialArray(m,n,stream=None):
+  return (-m * np.log(1.0 - RandomArray(n, stream)))
+
+def ErlangArray(k,b,n,stream=None):
+  #k exponentials per variate, summed in the same order as Erlang()
+  e = ExponentialArray(b, k * n, stream).reshape(n, k)
+  x = np.zeros(n)
+  for i in range(0,k):
+    x += e[:, i]
+  return (x)
+
+def _normalFromUniforms(m,s,u):
+  p0 = 0.322232431088     
+  q0 = 0.099348462606
+  p1 = 1.0                
+  q1 = 0.588581570495
+  p2 = 0.342242088547     
+  q2 = 0.531103462366
+  p3 = 0.204231210245e-1  
+  q3 = 0.103537752850
+  p4 = 0.453642210148e-4  
+  q4 = 0.385607006340e-2
+
+  low = (u < 0.5)
+  t = np.sqrt(-2.0 * np.log(np.where(low, u, 1.0 - u)))
+
+  p   = p0 + t * (p1 + t * (p2 + t * (p3 + t * p4)))
+  q   = q0 + t * (q1 + t * (q2 + t * (q3 + t * q4)))
+
+  z = np.where(low, (p / q) - t, t - (p / q))
+  return (m + s * z)
+
+def NormalArray(m,s,n,stream=None):
+  return _normalFromUniforms(m, s, RandomArray(n, stream))
+
+def LognormalArray(a,b,n,stream=None):
+  return (np.exp(a + b * NormalArray(0.0, 1.0, n, stream)))
+
+def _chisquareFromUniforms(k,u):
+  #u has shape (n, k): one row of normals per variate
+  x = np.zeros(u.shape[0])
+  for i in range(0,k):
+    z  = _normalFromUniforms(0.0, 1.0, u[:, i])
+    x += z * z
+  return (x)
+
+def ChisquareArray(k,n,stream=None):
+  return _chisquareFromUniforms(k, RandomArray(k * n, stream).reshape(n, k))
+
+def StudentArray(k,n,stream=None):
+  #Student() uses one normal followed by Chisquare(k): k + 1 uniforms per variate
+  u = RandomArray((k + 1) * n, stream).reshape(n, k + 1)
+  return (_normalFromUniforms(0.0, 1.0, u[:, 0]) / np.sqrt(_chisquareFromUniforms(k, u[:, 1:]) / k))
+
 def testFunctions():
   #tests to ensure that all variates match what was produced by C version of program (with the same order and parameters)
 
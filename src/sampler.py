@@ -0,0 +1,109 @@
+import numpy as np
+
+# --- Campionamento delle serie temporali di una replica ---
+# Registra più serie negli istanti esatti k * interval (k = 0, 1, ...) fino a stop. Tra due eventi lo
+# stato del sistema è costante, quindi le aree cumulative in un istante di campionamento interno
+# all'intervallo [t, t + dt) si ottengono per interpolazione lineare e nessun campione viene saltato
+# anche se un evento copre più intervalli. I valori sono tenuti in colonne NumPy di chunk_size righe;
+# con un file di destinazione ogni chunk pieno viene accodato al file e in memoria restano solo le
+# colonne in keep.
+class Sampler:
+    METRICS = (
+        "response_time",            # Tempo di risposta medio cumulativo dopo BIAS_PHASE
+        "window_response_time",     # Tempo di risposta medio nell'ultimo intervallo di campionamento
+        "queue_web",                # Job nei web server
+        "queue_spike",              # Job negli spike server
+        "utilization_web",          # Utilizzazione media dei web server nell'ultimo intervallo
+        "utilization_spike",        # Utilizzazione media degli spike server nell'ultimo intervallo
+        "spike_active",             # 1 se almeno uno spike server è attivo (ha almeno un job)
+    )
+
+    def __init__(self, interval, stop, metrics=("response_time",), chunk_size=4096, path=None, keep=()):
+        for name in metrics:
+            if name not in Sampler.METRICS:
+                raise ValueError(f"Serie sconosciuta '{name}', ammesse: {', '.join(Sampler.METRICS)}")
+        self.interval = interval
+        self.stop = stop
+        self.metrics = tuple(metrics)
+        self.names = ("time",) + self.metrics
+        self.path = path
+        self.next_time = 0.0
+        self._sample = 0
+        self._rows = 0
+        self._columns = {name: np.empty(chunk_size) for name in self.names}
+        self._kept = {name: [] for name in (self.names if path is None else keep)}
+        self._last = (0.0, 0.0, 0.0, 0)   # Aree e completamenti all'istante di campionamento precedente
+        if path is not None:
+            open(path, "wb").close()
+
+    def __len__(self):
+        return self._sample
+
+    def record(self, t, dt, n_web, n_spike, busy_web, busy_spike, track, transient, counting):
+        # Campioni negli istanti di [t, t + dt). n_* sono i job e busy_* la frazione di server occupati
+        # di ogni gruppo; track contiene le statistiche dopo BIAS_PHASE (aggiornate solo se counting),
+        # transient quelle dall'inizio della simulazione, entrambe ferme all'istante t
+        while self.next_time < t + dt:
+            elapsed = self.next_time - t
+            elapsed_track = elapsed if counting else 0.0
+            completed = track.completed_web + track.completed_spike
+            area = track.area_node_web + track.area_node_spike + (n_web + n_spike) * elapsed_track
+
+            area_total = transient.area_node_web + transient.area_node_spike + (n_web + n_spike) * elapsed
+            area_busy_web = transient.area_busy_web + busy_web * elapsed
+            area_busy_spike = transient.area_busy_spike + busy_spike * elapsed
+            completed_total = transient.completed_web + transient.completed_spike
+            last_area, last_busy_web, last_busy_spike, last_completed = self._last
+            self._last = (area_total, area_busy_web, area_busy_spike, completed_total)
+
+            values = {
+                "time": self.next_time,
+                "response_time": area / completed if completed > 0 else 0.0,
+                "window_response_time": (area_total - last_area) / (completed_total - last_completed) if completed_total > last_completed else 0.0,
+                "queue_web": n_web,
+                "queue_spike": n_spike,
+                "utilization_web": (area_busy_web - last_busy_web) / self.interval,
+                "utilization_spike": (area_busy_spike - last_busy_spike) / self.interval,
+                "spike_active": 1.0 if n_spike > 0 else 0.0,
+            }
+            for name in self.names:
+                self._columns[name][self._rows] = values[name]
+            self._rows += 1
+            if self._rows == len(self._columns["time"]):
+                self.flush()
+
+            self._sample += 1
+            self.next_time = self._sample * self.interval
+            if self.next_time > self.stop:
+                self.next_time = np.inf
+
+    def flush(self):
+        # Sposta il chunk corrente nel file (se presente) e nelle colonne tenute in memoria
+        if self._rows == 0:
+            return
+        if self.path is not None:
+            chunk = np.empty(self._rows, dtype=[(name, np.float64) for name in self.names])
+            for name in self.names:
+                chunk[name] = self._columns[name][:self._rows]
+            with open(self.path, "ab") as f:
+                np.save(f, chunk)
+        for name, chunks in self._kept.items():
+            chunks.append(self._columns[name][:self._rows].copy())
+        self._rows = 0
+
+    def columns(self):
+        # Serie tenute in memoria come dizionario nome -> array
+        self.flush()
+        return {name: np.concatenate(chunks) if chunks else np.empty(0) for name, chunks in self._kept.items()}
+
+    @staticmethod
+    def load(path, columns=None):
+        # Rilegge un file scritto da flush(), eventualmente solo alcune colonne
+        chunks = []
+        with open(path, "rb") as f:
+            while f.peek(1):
+                chunks.append(np.load(f))
+        if not chunks:
+            return {}
+        names = columns or chunks[0].dtype.names
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in names}
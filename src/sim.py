@@ -1,10 +1,27 @@
-from rngs import MODULUS, STREAMS, plantSeeds, selectStream
-from hyperexp import Hyperexponential
+from rngs import MODULUS, STREAMS, LehmerStream
+from hyperexp import HyperexponentialArray
+from dispatch import ServerGroup, make_dispatcher
+from autoscaler import Autoscaler
+from job_store import JobStore
+from event_list import EVENT_LISTS
+from sampler import Sampler
+from quantile_sketch import LogHistogram
+from event_trace import EventTrace
+from kernel import NUMBA_AVAILABLE, COUNTERS, OK, NEED_ARRIVALS, NEED_WEB, run_replica as run_kernel
 import logging
+import warnings
 import numpy as np
+import itertools
+import os
+import time
+import functools
+import collections
+from concurrent.futures import Future, ProcessPoolExecutor
 import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
 
-from welford_stats import WelfordStats
+from welford_stats import WelfordStats, WelfordStatsArray
+from result_cache import ResultCache
 
 # Configurazione logging per debug
 logging.basicConfig(level=logging.INFO, format='%(asctime)s[%(levelname)s] - %(message)s', datefmt='%H:%M:%S')
@@ -22,6 +39,7 @@ class Track:
         self.completed_spike = 0
 
         self.scaling_actions = 0
+        self.area_spike_instances = 0.0     # Istanze spike accese o in avvio integrate nel tempo (costo)
 
         # Metriche per verifica iperesponenziale
         # Per gli Arrivi
@@ -39,8 +57,6 @@ class Track:
         self.spike_serv_sq_sum = 0.0
         self.spike_serv_count = 0
 
-        self.transient_response_times = []
-
 # Helper per aggiornare le statistiche sperimentali
     def record_arrival(self, val):
         self.arr_sum += val
@@ -57,17 +73,144 @@ class Track:
         self.spike_serv_sq_sum += val * val
         self.spike_serv_count += 1
 
+    def counters(self):
+        # Contatori cumulativi (senza le serie campionate), usati per le differenze tra batch
+        return {key: value for key, value in vars(self).items() if not isinstance(value, list)}
+
+    @staticmethod
+    def from_counters(counters):
+        track = Track()
+        vars(track).update(counters)
+        return track
+
+    def results(self, interval_time):
+        # Metriche finali calcolate dai contatori su un intervallo di osservazione
+        def calc_mean_cv(sum_val, sq_sum, count):
+            if count < 2: return 0.0, 0.0
+            mean = sum_val / count
+            variance = (sq_sum - (sum_val**2 / count)) / (count - 1)
+            std_dev = np.sqrt(variance) if variance > 0 else 0.0
+            cv = std_dev / mean if mean > 0 else 0.0
+            return mean, cv
+
+        meas_arr_mean, meas_arr_cv = calc_mean_cv(self.arr_sum, self.arr_sq_sum, self.arr_count)
+        meas_web_mean, meas_web_cv = calc_mean_cv(self.web_serv_sum, self.web_serv_sq_sum, self.web_serv_count)
+        meas_spike_mean, meas_spike_cv = calc_mean_cv(self.spike_serv_sum, self.spike_serv_sq_sum, self.spike_serv_count)
+
+        total_jobs_completed = self.completed_web + self.completed_spike
+        avg_response_time_web = self.area_node_web / self.completed_web if self.completed_web > 0 else None
+        avg_response_time_spike = self.area_node_spike / self.completed_spike if self.completed_spike > 0 else None
+        avg_response_time_total = (self.area_node_web + self.area_node_spike) / total_jobs_completed if total_jobs_completed > 0 else None
+        utilization_web = self.area_busy_web / interval_time
+        utilization_spike = self.area_busy_spike / interval_time
+        throughput_web = self.completed_web / interval_time
+        throughput_spike = self.completed_spike / interval_time
+        throughput_total = total_jobs_completed / interval_time
+
+        return {
+            "web_response_time": avg_response_time_web,
+            "spike_response_time": avg_response_time_spike,
+            "total_response_time": avg_response_time_total,
+            "utilization_web": utilization_web,
+            "utilization_spike": utilization_spike,
+            "spike_instance_seconds": self.area_spike_instances,
+            "spike_instances": self.area_spike_instances / interval_time,
+            "throughput_web": throughput_web,
+            "throughput_spike": throughput_spike,
+            "throughput_total": throughput_total,
+            "scaling_actions": self.scaling_actions,
+            "meas_arrival_mean": meas_arr_mean,
+            "meas_arrival_cv": meas_arr_cv,
+            "meas_web_service_mean": meas_web_mean,
+            "meas_web_service_cv": meas_web_cv,
+            "meas_spike_service_mean": meas_spike_mean,
+            "meas_spike_service_cv": meas_spike_cv,
+        }
+
+# --- Traccia per Common Random Numbers ---
+class Trace:
+    # Traccia compatta di una replica: tempi di interarrivo e domande di servizio a media unitaria.
+    # La domanda effettiva è service_units[k] * web_mean oppure * spike_mean a seconda dell'instradamento,
+    # quindi la stessa traccia si può rigiocare con qualsiasi SI_max.
+    def __init__(self, interarrivals, service_units):
+        self.interarrivals = interarrivals
+        self.service_units = service_units
+
+    def __len__(self):
+        return len(self.interarrivals)
+
 # --- Programma Principale ---
 class Simulator:
     START      = 0.0
     STOP       = 5000.0         # Simuliamo fino a 5000 secondi
     BIAS_PHASE = 0         # Fase Transitoria di 500 secondi
     SAMPLING_INTERVAL = 100.0
-    NUM_SAMPLES = int((STOP - BIAS_PHASE) / SAMPLING_INTERVAL) + 1
     INFINITY   = 1e15
     SEED = 8
     REPLICAS = 1
-    N_PROCESSES = 1    # Numero di processi paralleli per eseguire le repliche, deve essere <= 85 se no non bastano gli stream RNG
+    N_PROCESSES = 1    # Numero di processi del pool che esegue le repliche
+    MAX_CHUNK_SIZE = 1 << 17   # Massimo numero di variate generate per blocco
+    CRN = False        # Common Random Numbers: ogni replica rigioca la stessa traccia per ogni configurazione
+    CRN_TRACE_CACHE = 64       # Tracce tenute in memoria da ogni worker
+    # Ogni ruolo (arrivi, web, spike) ha un gruppo di STREAMS // 3 stream consecutivi e ogni replica
+    # ne usa un tratto disgiunto di REPLICA_STRIDE numeri: i risultati di una replica non dipendono
+    # dal worker che la esegue né dal numero di processi
+    ARRIVAL_STREAM = 0
+    WEB_STREAM = STREAMS // 3
+    SPIKE_STREAM = 2 * (STREAMS // 3)
+    REPLICA_STRIDE = 1 << 20
+    MAX_REPLICAS = (STREAMS // 3) * (MODULUS // STREAMS) // REPLICA_STRIDE
+
+    BATCHES = 0        # Numero di batch della modalità batch means (0 = repliche indipendenti)
+    AUTO_WARMUP = False        # Troncamento automatico del transitorio con MSER-5, in aggiunta a BIAS_PHASE
+    WARMUP_INTERVAL = 10.0     # Durata delle finestre della serie usata da MSER-5
+    RESULT_CACHE = None     # ResultCache opzionale: le repliche già salvate non vengono rieseguite
+    # Versione del motore nella chiave della cache: da incrementare a ogni modifica che cambia i risultati
+    # a parità di configurazione (stream, campionamento, lista degli eventi, dispatch, autoscaling, ...)
+    ENGINE_VERSION = 3
+    AGGREGATION_BLOCK = 5   # Repliche eseguite da ogni task del pool, che invia solo il loro riassunto
+    RAW_KEYS = ("batch_counters",)  # Risultati di replica che non vengono aggregati
+    SHARED_TRANSIENT = False    # I worker scrivono le serie transitorie in una matrice in memoria condivisa
+    SAMPLED_SERIES = ()     # Serie di Sampler.METRICS campionate ogni SAMPLING_INTERVAL oltre al tempo di risposta
+    SAMPLES_DIR = None      # Se impostata, le serie di ogni replica vengono scritte a blocchi in un file .npy
+    WEB_SERVERS = 1        # Numero di web server
+    SPIKE_SERVERS = 1      # Numero di spike server
+    DISPATCH = "threshold"  # Politica di dispatch: "threshold", "jsq", "power_of_d" o "round_robin"
+    DISPATCH_D = 2         # Server estratti da power_of_d
+    # Autoscaling degli spike server: senza, uno spike server è disponibile appena riceve un job e
+    # si spegne appena resta vuoto, e il costo coincide con il tempo di occupazione
+    AUTOSCALING = False
+    SPIKE_BOOT_TIME = 30.0      # Secondi per avviare un'istanza spike
+    SPIKE_IDLE_TIMEOUT = 60.0   # Secondi senza job dopo i quali un'istanza si spegne
+    SPIKE_MIN_INSTANCES = 0     # Istanze sempre accese
+    SCALE_UP_JOBS = None        # Job spike per istanza oltre i quali se ne avvia un'altra (None = SI_max)
+    SCALE_UP_RESPONSE_TIME = None   # Soglia sul tempo di risposta della finestra di controllo (None = non usata)
+    CONTROL_INTERVAL = 10.0     # Durata della finestra di controllo sul tempo di risposta
+    SCALE_UP_COOLDOWN = 30.0    # Secondi minimi tra due avvii di istanze spike
+    EVENT_LIST = "heap"     # Lista degli eventi futuri: "heap" (binary heap) o "calendar" (calendar queue)
+    # Kernel compilato con Numba (kernel.py) per le repliche del modello base: un web e uno spike
+    # server, senza autoscaling, batch, MSER o serie aggiuntive. Dà gli stessi risultati del motore a
+    # eventi, che resta in uso per le altre configurazioni e quando Numba non è installato
+    KERNEL = False
+    # Traccia degli eventi (event_trace.py) per il debug del motore a eventi: con TRACE_DIR ogni replica
+    # scrive tutti gli eventi in un file, altrimenti restano in memoria gli ultimi TRACE_CAPACITY e in
+    # caso di errore vengono riportati nel log. Disattivata non costa nulla per evento
+    TRACE = False
+    TRACE_DIR = None
+    TRACE_CAPACITY = 1 << 16
+    # Tipi di evento, a parità di istante vengono processati in quest'ordine
+    COMPLETION = 0
+    ARRIVAL = 1
+    BOOT = 2            # Un'istanza spike ha terminato l'avvio
+    IDLE_TIMEOUT = 3    # Un'istanza spike è rimasta senza job per SPIKE_IDLE_TIMEOUT secondi
+    CONTROL = 4         # Controllo periodico del tempo di risposta per l'autoscaling
+    QUANTILES = (0.5, 0.95, 0.99)   # Quantili dei tempi di risposta dei singoli job
+    SKETCH_ACCURACY = 0.01  # Errore relativo massimo dei quantili stimati con LogHistogram
+
+    _pool = None
+    _pool_size = 0
+    _report_start = 0.0     # Inizio della finestra del report sul carico dei worker
+    _worker_busy = {}  # pid del worker -> [repliche eseguite, secondi di lavoro] nella finestra
 
     def __init__(self, seed=SEED):
         # --- Parametri del Modello di default ---
@@ -77,8 +220,15 @@ class Simulator:
         self._spike_mean   = 0.16          # Tasso identico al web server
         self._cv           = 4.0           # Coefficiente di variazione
         self._stream_usage = {}
+        self._arrival_rng = None
+        self._web_rng = None
+        self._spike_rng = None
+        self._arrivals = None
+        self._services_web = None
+        self._services_spike = None
+        self._traces = {}
+        self.event_trace = None     # Traccia degli eventi dell'ultima replica, se TRACE
         self.seed = seed
-        self.reset()
 
     @property
     def SI_max(self):
@@ -131,280 +281,882 @@ class Simulator:
         return (self._SI_max, self._arrival_mean, self._web_mean, self._spike_mean, self._cv)
         
     def reset(self):
-        plantSeeds(self.seed)
+        # Deprecato: le repliche usano stream LehmerStream propri e non c'è più stato globale da
+        # riseminare; azzera solo il conteggio dell'uso degli stream
+        warnings.warn("Simulator.reset() è deprecato: gli stream delle repliche non dipendono dallo stato globale di rngs",
+                      DeprecationWarning, stacklevel=2)
         self._stream_usage = {}
 
     def reset_seed(self):
-        plantSeeds(self.seed)
+        # Deprecato, non fa nulla: il seme è letto da self.seed all'avvio di ogni replica
+        warnings.warn("Simulator.reset_seed() è deprecato: il seme viene letto da self.seed a ogni replica",
+                      DeprecationWarning, stacklevel=2)
 
-    def _GetArrival(self, stream):
-        selectStream(stream) # Stream 0 per gli arrivi
-        self._track_rng_usage(stream, 2)  # l'iperesponenziale usa 2 RNG per ogni chiamata
-        return Hyperexponential(self.arrival_mean, self.cv)
+    def _replica_stream(self, role_stream, replica):
+        # Stream Lehmer indipendente della replica per un ruolo, nessuno stato globale condiviso
+        rng = LehmerStream(self.seed, role_stream)
+        rng.jump(replica * Simulator.REPLICA_STRIDE)
+        return rng
+
+    def _plant_streams(self, replica):
+        self._arrival_rng = self._replica_stream(Simulator.ARRIVAL_STREAM, replica)
+        self._web_rng = self._replica_stream(Simulator.WEB_STREAM, replica)
+        self._spike_rng = self._replica_stream(Simulator.SPIKE_STREAM, replica)
+
+        # Buffer di interarrivi e domande di servizio pre-generati a blocchi,
+        # dimensionati sul numero atteso di arrivi in STOP secondi
+        chunk_size = min(int(1.1 * Simulator.STOP / self.arrival_mean) + 1, Simulator.MAX_CHUNK_SIZE)
+        self._arrivals = self._variates(self.arrival_mean, self._arrival_rng, chunk_size)
+        self._services_web = self._variates(self.web_mean, self._web_rng, chunk_size)
+        self._services_spike = self._variates(self.spike_mean, self._spike_rng, chunk_size)
+
+    def _variates(self, mean, rng, chunk_size):
+        # Generatore di variate iperesponenziali: ogni blocco viene generato in una sola chiamata
+        # e l'uso dello stream è contabilizzato per blocco invece che per singola variata
+        while True:
+            chunk = HyperexponentialArray(mean, self.cv, chunk_size, rng)
+            self._track_rng_usage(rng.index, 2 * chunk_size)  # l'iperesponenziale usa 2 RNG per variata
+            yield from chunk.tolist()
+
+    def generate_trace(self, replica):
+        # Traccia della replica: arrivi dal tratto della replica nello stream degli arrivi, domande
+        # unitarie da quello nello stream web, quindi non dipende dal worker che la esegue
+        arrival_rng = self._replica_stream(Simulator.ARRIVAL_STREAM, replica)
+        service_rng = self._replica_stream(Simulator.WEB_STREAM, replica)
+
+        chunk_size = int(1.1 * Simulator.STOP / self.arrival_mean) + 1
+        interarrivals = HyperexponentialArray(self.arrival_mean, self.cv, chunk_size, arrival_rng)
+        # Servono gli interarrivi fino al primo arrivo oltre STOP, più un piccolo margine
+        while len(interarrivals) < np.searchsorted(np.cumsum(interarrivals), Simulator.STOP) + 3:
+            interarrivals = np.concatenate((interarrivals, HyperexponentialArray(self.arrival_mean, self.cv, chunk_size, arrival_rng)))
+        n = int(np.searchsorted(np.cumsum(interarrivals), Simulator.STOP)) + 3
+        if 2 * n > Simulator.REPLICA_STRIDE:
+            raise ValueError(f"La traccia della replica {replica} richiede {2 * n} numeri casuali, più di REPLICA_STRIDE")
+        service_units = HyperexponentialArray(1.0, self.cv, n, service_rng)
+        return Trace(interarrivals[:n], service_units)
+
+    def _get_trace(self, replica):
+        # Le tracce dipendono solo da seed, arrival_mean, cv e STOP: se non cambiano vengono
+        # riutilizzate tra configurazioni (es. lo sweep su SI_max) senza rigenerarle
+        key = (self.seed, self.arrival_mean, self.cv, Simulator.STOP, replica)
+        trace = self._traces.get(key)
+        if trace is None:
+            if len(self._traces) >= Simulator.CRN_TRACE_CACHE:
+                del self._traces[next(iter(self._traces))]   # Elimino la traccia più vecchia
+            trace = self._traces[key] = self.generate_trace(replica)
+        return trace
+
+    def _replay_trace(self, trace):
+        # Rigioca la traccia: i due iteratori dei servizi condividono lo stesso iteratore delle
+        # domande unitarie, così il k-esimo arrivo usa la k-esima domanda qualunque sia il server
+        self._arrivals = itertools.chain(trace.interarrivals.tolist(), itertools.repeat(Simulator.INFINITY))
+        units = iter(trace.service_units.tolist())
+        self._services_web = map(float(self.web_mean).__mul__, units)   # float(): int.__mul__(float) dà NotImplemented
+        self._services_spike = map(float(self.spike_mean).__mul__, units)
 
-    def _GetServiceWeb(self, stream):
-        selectStream(stream) # Stream 1 per il Web Server
-        self._track_rng_usage(stream, 2)  # l'iperesponenziale usa 2 RNG per ogni chiamata
-        return Hyperexponential(self.web_mean, self.cv)
-    
-    def _GetServiceSpike(self, stream):
-        selectStream(stream) # Stream 2 per lo Spike Server 
-        self._track_rng_usage(stream, 2)  # l'iperesponenziale usa 2 RNG per ogni chiamata
-        return Hyperexponential(self.spike_mean, self.cv)
-    
     def _track_rng_usage(self, stream, count=1):
         if stream not in self._stream_usage:
             self._stream_usage[stream] = 0
         self._stream_usage[stream] += count
-    class Job:
-        def __init__(self, arrival_time, service_demand, is_spike=False):
-            self.arrival_time = arrival_time
-            self.service_demand = service_demand
-            self.remaining_work = service_demand
-            self.is_spike = is_spike
-
-    def run(self):
-        queue_input = [multiprocessing.Queue() for _ in range(Simulator.N_PROCESSES)]
-        queue_output = multiprocessing.Queue()
-
-        for replica in range(Simulator.REPLICAS):
-            target_queue = queue_input[replica % Simulator.N_PROCESSES]
-            target_queue.put(replica)
-            logging.debug(f"Replica #{replica} inviata al queue input")
-
-        for worker in range(Simulator.N_PROCESSES):
-            queue_input[worker].put(None)  # Segnali di terminazione
-        
-        processes = []
-        for worker_id in range(Simulator.N_PROCESSES):
-            p = multiprocessing.Process(target=self._run, args=(worker_id, queue_input[worker_id], queue_output, self._SI_max))
-            processes.append(p)
-            p.start()
+    @staticmethod
+    def get_pool():
+        # Pool di processi persistente, condiviso da tutte le configurazioni: viene creato una sola
+        # volta e ricreato solo se cambia N_PROCESSES. Le repliche stanno in un'unica coda condivisa
+        # da cui ogni worker libero preleva la successiva, quindi il carico si bilancia da solo
+        if Simulator._pool is None or Simulator._pool_size != Simulator.N_PROCESSES:
+            Simulator.shutdown_pool()
+            # Il resource tracker va avviato prima dei worker: con fork lo ereditano solo se esiste già,
+            # altrimenti ognuno ne avvia uno proprio che alla sua uscita rimuove i segmenti condivisi
+            resource_tracker.ensure_running()
+            Simulator._pool = ProcessPoolExecutor(max_workers=Simulator.N_PROCESSES)
+            Simulator._pool_size = Simulator.N_PROCESSES
+            Simulator.reset_worker_report()
+        return Simulator._pool
 
+    @staticmethod
+    def shutdown_pool():
+        if Simulator._pool is not None:
+            Simulator._pool.shutdown()
+            Simulator._pool = None
+            Simulator._pool_size = 0
 
-        stats = {}
+    @staticmethod
+    def reset_worker_report():
+        # Apre una nuova finestra per il report sul carico (es. all'inizio di uno sweep), così il pool
+        # persistente non mescola il lavoro di esecuzioni precedenti
+        Simulator._report_start = time.perf_counter()
+        Simulator._worker_busy = {}
+
+    @staticmethod
+    def worker_report():
+        # Tempo trascorso dall'inizio della finestra e lavoro svolto da ogni worker
+        wall = time.perf_counter() - Simulator._report_start
+        return wall, {pid: tuple(busy) for pid, busy in Simulator._worker_busy.items()}
+
+    @staticmethod
+    def log_worker_report():
+        wall, busy = Simulator.worker_report()
+        if not busy or wall <= 0:
+            return
+        for pid, (replicas, seconds) in sorted(busy.items()):
+            logging.info(f"Worker {pid}: {replicas} repliche, occupato per {seconds:.2f}s ({100 * seconds / wall:.1f}% di {wall:.2f}s)")
+        total = sum(seconds for _, seconds in busy.values())
+        logging.info(f"Efficienza del pool: {100 * total / (wall * Simulator._pool_size):.1f}% su {Simulator._pool_size} processi")
+        Simulator.reset_worker_report()
+
+    def get_config(self):
+        # Fotografia della configurazione corrente, inviata ai worker insieme all'indice della replica
+        return {
+            "seed": self.seed,
+            "parameters": self.get_parameters(),
+            "crn": self.CRN,
+            "STOP": self.STOP,
+            "BIAS_PHASE": self.BIAS_PHASE,
+            "SAMPLING_INTERVAL": self.SAMPLING_INTERVAL,
+            "batches": self.BATCHES,
+            "auto_warmup": self.AUTO_WARMUP,
+            "WARMUP_INTERVAL": self.WARMUP_INTERVAL,
+            "servers": [self.WEB_SERVERS, self.SPIKE_SERVERS],
+            "dispatch": [self.DISPATCH, self.DISPATCH_D],
+            "autoscaling": [self.AUTOSCALING, self.SPIKE_BOOT_TIME, self.SPIKE_IDLE_TIMEOUT, self.SPIKE_MIN_INSTANCES,
+                            self.SCALE_UP_JOBS, self.SCALE_UP_RESPONSE_TIME, self.CONTROL_INTERVAL, self.SCALE_UP_COOLDOWN],
+            "event_list": self.EVENT_LIST,
+            "kernel": self.KERNEL,
+            "trace": [self.TRACE, self.TRACE_DIR, self.TRACE_CAPACITY],
+            "quantiles": list(self.QUANTILES),
+            "sketch_accuracy": self.SKETCH_ACCURACY,
+            "series": list(self.SAMPLED_SERIES),
+            "samples_dir": self.SAMPLES_DIR,
+        }
 
-        # Processo i risultati intanto
-        for i in range(Simulator.REPLICAS):
-            result = queue_output.get()
-            
-            for key, value in result.items():
-                if value is not None:
-                    if key not in stats:
-                        if isinstance(value, list) is not True:
-                            stats[key] = WelfordStats()
-                        else:
-                            
-                            stats[key] = [WelfordStats() for _ in range(Simulator.NUM_SAMPLES)]
-                    if isinstance(value, list):
-                        for idx, val in enumerate(value):
-                            if idx < Simulator.NUM_SAMPLES:
-                                stats[key][idx].update(val)
+    def configure(self, config):
+        self.seed = config["seed"]
+        self.set_parameters(*config["parameters"])
+        self.CRN = config["crn"]
+        self.BATCHES = config["batches"]
+        self.AUTO_WARMUP = config["auto_warmup"]
+        Simulator.WARMUP_INTERVAL = config["WARMUP_INTERVAL"]
+        Simulator.STOP = config["STOP"]
+        Simulator.BIAS_PHASE = config["BIAS_PHASE"]
+        Simulator.SAMPLING_INTERVAL = config["SAMPLING_INTERVAL"]
+        self.SAMPLED_SERIES = tuple(config["series"])
+        self.WEB_SERVERS, self.SPIKE_SERVERS = config["servers"]
+        self.DISPATCH, self.DISPATCH_D = config["dispatch"]
+        (self.AUTOSCALING, self.SPIKE_BOOT_TIME, self.SPIKE_IDLE_TIMEOUT, self.SPIKE_MIN_INSTANCES,
+         self.SCALE_UP_JOBS, self.SCALE_UP_RESPONSE_TIME, self.CONTROL_INTERVAL, self.SCALE_UP_COOLDOWN) = config["autoscaling"]
+        self.EVENT_LIST = config["event_list"]
+        self.KERNEL = config["kernel"]
+        self.TRACE, self.TRACE_DIR, self.TRACE_CAPACITY = config["trace"]
+        self.QUANTILES = tuple(config["quantiles"])
+        self.SKETCH_ACCURACY = config["sketch_accuracy"]
+        self.SAMPLES_DIR = config["samples_dir"]
+
+    def submit(self, replicas=None, block=None, raw=False, shared=None, cached=None):
+        # Invia al pool le repliche della configurazione corrente (di default 0..REPLICAS-1) senza
+        # attendere i risultati, così più configurazioni possono essere in esecuzione contemporaneamente.
+        # Ogni task esegue un blocco di 'block' repliche consecutive (di default AGGREGATION_BLOCK) e
+        # restituisce solo il riassunto delle statistiche; con raw=True, o se c'è la cache dei risultati,
+        # restituisce anche i risultati delle singole repliche. Con shared=True (di default SHARED_TRANSIENT)
+        # le serie transitorie non passano dai riassunti né dai risultati grezzi ma vengono scritte dai worker in una matrice
+        # (repliche x istanti di campionamento) in memoria condivisa, una riga per replica.
+        # cached sono i risultati della cache già letti per questa configurazione (di default li legge)
+        replicas = range(self.REPLICAS) if replicas is None else replicas
+        block = block or Simulator.AGGREGATION_BLOCK
+        shared = Simulator.SHARED_TRANSIENT if shared is None else shared
+        if len(replicas) > 0 and max(replicas) >= Simulator.MAX_REPLICAS:
+            raise ValueError(f"REPLICAS deve essere <= {Simulator.MAX_REPLICAS} se no non bastano gli stream RNG")
+        pool = Simulator.get_pool()
+        config = self.get_config()
+        num_samples = int((config["STOP"] - config["BIAS_PHASE"]) / config["SAMPLING_INTERVAL"]) + 1
+
+        cache = Simulator.RESULT_CACHE
+        if cache is not None:
+            key = ResultCache.key(self._cache_config(config))
+            if cached is None:
+                cached = cache.get_all(key)
+        else:
+            cached = {}
+
+        series = None
+        if shared and len(replicas) > 0:
+            series = shared_memory.SharedMemory(create=True, size=len(replicas) * num_samples * 8)
+            np.ndarray((len(replicas), num_samples), dtype=np.float64, buffer=series.buf)[:] = np.nan
+        row = {replica: i for i, replica in enumerate(replicas)}
+
+        futures = []
+        hits = [replica for replica in replicas if replica in cached]
+        if hits:
+            logging.info(f"{len(hits)}/{len(replicas)} repliche già presenti nella cache dei risultati")
+            summary = {}
+            for replica in hits:
+                if series is not None:
+                    _write_series(series, len(replicas), num_samples, row[replica], cached[replica])
+                    Simulator._record_result(summary, _without_series(cached[replica]), num_samples)
+                else:
+                    Simulator._record_result(summary, cached[replica], num_samples)
+            future = Future()
+            future.set_result((None, 0.0, len(hits), summary, [cached[replica] for replica in hits] if raw else None))
+            futures.append(future)
+
+        # Con la memoria condivisa i risultati grezzi per la cache arrivano senza serie transitoria:
+        # collect() li salva leggendo la serie dalla riga della matrice, prima di rimuoverla
+        stores = []
+        missing = [replica for replica in replicas if replica not in cached]
+        for i in range(0, len(missing), block):
+            chunk = missing[i:i + block]
+            target = (series.name, len(replicas), [row[replica] for replica in chunk]) if series is not None else None
+            future = pool.submit(_simulate_replicas, config, chunk, num_samples, raw or cache is not None, target)
+            if cache is not None:
+                if series is not None:
+                    stores.append((future, key, chunk, target[2]))
+                else:
+                    future.add_done_callback(functools.partial(cache.store, key, chunk))
+            futures.append(future)
+        logging.debug(f"Repliche {list(replicas)} inviate al pool")
+        return self.get_parameters(), num_samples, futures, series, stores
+
+    def _cache_config(self, config):
+        # Oltre alla configurazione, i risultati dipendono dalla disposizione degli stream delle repliche
+        return dict(config, streams=(Simulator.ARRIVAL_STREAM, Simulator.WEB_STREAM, Simulator.SPIKE_STREAM, Simulator.REPLICA_STRIDE),
+                    engine=Simulator.ENGINE_VERSION)
+
+    @staticmethod
+    def _record_busy(pid, busy_time, replicas=1):
+        if pid is not None:     # I risultati presi dalla cache non hanno un worker
+            worker = Simulator._worker_busy.setdefault(pid, [0, 0.0])
+            worker[0] += replicas
+            worker[1] += busy_time
+
+    @staticmethod
+    def _record_result(stats, result, num_samples):
+        for key, value in result.items():
+            if value is not None and key not in Simulator.RAW_KEYS:
+                if key.endswith("_histogram"):
+                    # Istogrammi dei tempi di risposta: si uniscono i conteggi di tutte le repliche
+                    histogram = LogHistogram.from_dict(value)
+                    stats[key] = stats[key].merge(histogram) if key in stats else histogram
+                    continue
+                if key not in stats:
+                    if isinstance(value, list) is not True:
+                        stats[key] = WelfordStats()
                     else:
-                        stats[key].update(value)
-                
-            if (i + 1) % 10 == 0:
-                logging.info(f"Raccolte {i + 1}/{Simulator.REPLICAS} repliche...")
+                        # Un accumulatore per istante di campionamento, aggiornati in blocco
+                        stats[key] = WelfordStatsArray(num_samples)
+                stats[key].update(value)
 
-        for p in processes:
-            p.join()
+    @staticmethod
+    def _merge_summary(stats, summary):
+        # Unisce il riassunto di un blocco di repliche (accumulatori di Welford) alle statistiche
+        for key, accumulator in summary.items():
+            if key in stats:
+                stats[key].merge(accumulator)
+            else:
+                stats[key] = accumulator
 
-        return self.get_parameters(), stats
+    @staticmethod
+    def collect(pending):
+        # Raccoglie i riassunti di una configurazione inviata con submit(), in ordine di blocco
+        # così le statistiche non dipendono dall'ordine di completamento
+        parameters, num_samples, futures, series, stores = pending
+        stats = {}
+        collected = 0
 
-    def _run(self, worker_id, queue_input, queue_output, SI_max):
-        plantSeeds(self.seed)
-        arrival_stream = worker_id
-        web_stream = Simulator.N_PROCESSES + worker_id
-        spike_stream = 2 * Simulator.N_PROCESSES + worker_id
+        try:
+            for future in futures:
+                pid, busy_time, count, summary, _ = future.result()
+                Simulator._record_busy(pid, busy_time, count)
+                Simulator._merge_summary(stats, summary)
+                collected += count
+                logging.debug(f"Raccolte {collected} repliche...")
 
-        
-        
-        input_replica = queue_input.get()
-        logging.debug(f"Queue Input Replica: {input_replica}")
-        while input_replica is not None:
-            transient_list = []
-            sample = 0
-            t = Simulator.START
-            track = Track()
-            track_transient = Track()
-            t = Simulator.START
-            time_to_next_arrival = self._GetArrival(arrival_stream)
-            track.record_arrival(time_to_next_arrival)
-            web_jobs = []
-            spike_jobs = []
+            if series is not None:
+                # Media e varianza per istante di campionamento calcolate sull'intera matrice
+                values = np.ndarray((series.size // (8 * num_samples), num_samples), dtype=np.float64, buffer=series.buf)
+                stats["transient_response_times"] = WelfordStatsArray.from_array(values)
+                for future, key, chunk, rows in stores:
+                    for replica, row, result in zip(chunk, rows, future.result()[4]):
+                        transient = values[row][~np.isnan(values[row])].tolist()    # Senza il riempimento NaN
+                        Simulator.RESULT_CACHE.put(key, replica, dict(result, transient_response_times=transient))
+                del values
+        finally:
+            if series is not None:
+                series.close()
+                series.unlink()
 
-        
-            while (t < Simulator.STOP or len(web_jobs) > 0 or len(spike_jobs) > 0):
-                # Per trovare il prossimo evento devo vedere chi è che il tempo di completamento più piccolo e confrontarlo con il prossimo arrivo
-                logging.debug(f"Current Time: {t}")
-
-                logging.debug(f"Next Arrival Event at: {time_to_next_arrival}")
-                min_work_web_job = None
-                min_work_spike_job = None
-
-                if len(web_jobs) > 0:
-                    # trovo il job con il minimo lavoro rimanente nel web server
-                    min_work_web_job = min(web_jobs, key=lambda job: job.remaining_work)
-                    time_to_complete_web = min_work_web_job.remaining_work * len(web_jobs)
-                    logging.debug(f"Time to Complete Web Job: {time_to_complete_web} (Remaining Work: {min_work_web_job.remaining_work})")
-                if len(spike_jobs) > 0:
-                    # trovo il job con il minimo lavoro rimanente nello spike server
-                    min_work_spike_job = min(spike_jobs, key=lambda job: job.remaining_work)
-                    time_to_complete_spike = min_work_spike_job.remaining_work * len(spike_jobs)
-                    logging.debug(f"Time to Complete Spike Job: {time_to_complete_spike} (Remaining Work: {min_work_spike_job.remaining_work})")
-
-                time_to_next_event = min(
-                    time_to_next_arrival,
-                    time_to_complete_web if len(web_jobs) > 0 else Simulator.INFINITY,
-                    time_to_complete_spike if len(spike_jobs) > 0 else Simulator.INFINITY
-                )
-                logging.debug(f"Next Time Event at: {time_to_next_event}")
-
-                # Aggiorno le aree sotto le curve per calcolare le statistiche di utilizzo e numero di job
+        return parameters, stats
+
+    @staticmethod
+    def precision_reached(stats, metrics, relative_precision=None, absolute_precision=None):
+        # Vero se la semiampiezza dell'intervallo di confidenza al 95% di ogni metrica rispetta la
+        # precisione assoluta e/o relativa (rispetto alla media) richiesta. Le metriche mai osservate
+        # (es. spike_response_time senza job sullo spike server) vengono ignorate
+        for metric in metrics:
+            w = stats.get(metric)
+            if w is None:
+                continue
+            if w.n < 2:
+                return False
+            ci = w.confidence_interval_95()
+            if absolute_precision is not None and ci > absolute_precision:
+                return False
+            if relative_precision is not None and ci > relative_precision * abs(w.mean):
+                return False
+        return True
+
+    def metric_names(self):
+        # Metriche scalari dei risultati di una replica, usabili come criterio di arresto
+        names = list(Track().results(1.0)) + ["warmup_time"]
+        names += [f"{name}_response_time_p{round(100 * q)}" for name in ("web", "spike", "total") for q in self.QUANTILES]
+        return names
+
+    def run(self, metrics=None, relative_precision=None, absolute_precision=None, min_replicas=10, max_replicas=None):
+        # Senza precisione richiesta esegue REPLICAS repliche, altrimenti usa l'arresto sequenziale
+        if relative_precision is None and absolute_precision is None:
+            return Simulator.collect(self.submit())
+        return self._run_sequential(metrics or ["total_response_time"], relative_precision, absolute_precision, min_replicas, max_replicas)
+
+    def _run_sequential(self, metrics, relative_precision, absolute_precision, min_replicas, max_replicas):
+        # Arresto sequenziale: le repliche vengono inviate al pool tenendo sempre una finestra in volo
+        # e i risultati sono considerati in ordine di replica (quindi il numero finale di repliche non
+        # dipende dallo scheduling). Appena tutte le metriche raggiungono la precisione, con almeno
+        # min_replicas repliche, le repliche ancora in coda vengono cancellate
+        unknown = [metric for metric in metrics if metric not in self.metric_names()]
+        if unknown:
+            raise ValueError(f"Metriche sconosciute {unknown}, ammesse: {', '.join(self.metric_names())}")
+        max_replicas = min(max_replicas or Simulator.MAX_REPLICAS, Simulator.MAX_REPLICAS)
+        window = min(max(min_replicas, 2 * Simulator.N_PROCESSES), max_replicas)
+        # La cache viene letta una volta sola, non a ogni replica inviata
+        cached = None
+        if Simulator.RESULT_CACHE is not None:
+            cached = Simulator.RESULT_CACHE.get_all(ResultCache.key(self._cache_config(self.get_config())))
+        parameters, num_samples, futures, _, _ = self.submit(range(window), block=1, shared=False, cached=cached)
+        in_flight = collections.deque(futures)
+        next_replica = window
+        stats = {}
+        n = 0
+
+        while in_flight:
+            pid, busy_time, count, summary, _ = in_flight.popleft().result()
+            Simulator._record_busy(pid, busy_time, count)
+            Simulator._merge_summary(stats, summary)
+            n += count
+            if n >= min_replicas and Simulator.precision_reached(stats, metrics, relative_precision, absolute_precision):
+                for future in in_flight:
+                    future.cancel()
+                logging.info(f"Precisione richiesta raggiunta dopo {n} repliche")
+                return parameters, stats
+            if next_replica < max_replicas:
+                in_flight.extend(self.submit(range(next_replica, next_replica + 1), block=1, shared=False, cached=cached)[2])
+                next_replica += 1
+
+        logging.warning(f"Precisione richiesta non raggiunta con il massimo di {n} repliche")
+        return parameters, stats
+
+    @staticmethod
+    def lag1_autocorrelation(values):
+        x = np.asarray(values, dtype=float)
+        d = x - x.mean()
+        den = np.dot(d, d)
+        return float(np.dot(d[:-1], d[1:]) / den) if den > 0 else 0.0
+
+    @staticmethod
+    def mser(values, batch_size=5):
+        # MSER-m (default MSER-5): le osservazioni vengono raggruppate in medie di batch_size e si
+        # sceglie il numero d di batch iniziali da scartare che minimizza var(Z_d..Z_k) / (k - d),
+        # cercando solo nella prima metà della serie. Restituisce il troncamento in osservazioni
+        x = np.asarray(values, dtype=float)
+        k = len(x) // batch_size
+        if k < 2:
+            return 0
+        z = x[:k * batch_size].reshape(k, batch_size).mean(axis=1)
+        remaining = k - np.arange(k)
+        s1 = np.cumsum(z[::-1])[::-1]
+        s2 = np.cumsum((z * z)[::-1])[::-1]
+        mser = (s2 - s1 * s1 / remaining) / remaining ** 2
+        d = int(np.argmin(mser[:k // 2 + 1]))
+        return d * batch_size
+
+    def run_batch_means(self, metrics=None, batches=256, min_batches=20, max_lag1=0.2):
+        # Stima a regime con batch means: una sola replica lunga STOP secondi (dopo BIAS_PHASE) viene
+        # divisa in 'batches' batch di base. I batch adiacenti vengono accorpati a coppie finché
+        # l'autocorrelazione lag-1 delle medie di ogni metrica in 'metrics' scende sotto max_lag1,
+        # senza scendere sotto min_batches. Le statistiche hanno le stesse chiavi di replica_results,
+        # calcolate sulle medie dei batch
+        metrics = metrics or ["total_response_time"]
+        saved_batches = self.BATCHES
+        self.BATCHES = batches
+        try:
+            parameters, _, futures, _, _ = self.submit(range(1), raw=True, shared=False)
+        finally:
+            self.BATCHES = saved_batches
+        pid, busy_time, count, _, results = futures[0].result()
+        Simulator._record_busy(pid, busy_time, count)
+        result = results[0]
+
+        # Contatori di ogni batch di base come differenza tra inizi consecutivi
+        snapshots = result["batch_counters"]
+        base = [{key: b[key] - a[key] for key in a} for a, b in zip(snapshots, snapshots[1:])]
+        base_length = (self.STOP - self.BIAS_PHASE) / batches
+        if self.AUTO_WARMUP:
+            # Scarto i batch di base del transitorio scelti da MSER-5
+            d = Simulator.mser([(c["area_node_web"] + c["area_node_spike"]) / base_length for c in base])
+            base = base[d:]
+            logging.info(f"MSER-5: scartati i primi {d} batch ({d * base_length:.1f}s) come transitorio")
+
+        group = 1
+        while True:
+            n = len(base) // group
+            merged = [{key: sum(c[key] for c in base[i * group:(i + 1) * group]) for key in base[0]} for i in range(n)]
+            batch_results = [Track.from_counters(c).results(base_length * group) for c in merged]
+            lag1 = {metric: Simulator.lag1_autocorrelation([r[metric] for r in batch_results if r[metric] is not None]) for metric in metrics}
+            if all(abs(r) <= max_lag1 for r in lag1.values()):
+                break
+            if n // 2 < min_batches:
+                logging.warning(f"Autocorrelazione lag-1 {lag1} oltre {max_lag1} con il minimo di {n} batch, allungare STOP")
+                break
+            group *= 2
+
+        stats = {}
+        for r in batch_results:
+            Simulator._record_result(stats, r, 0)
+        logging.info(f"Batch means: {n} batch da {base_length * group:.1f}s, autocorrelazione lag-1 {lag1}")
+        return parameters, stats
+
+    def _kernel_supported(self):
+        return (self.WEB_SERVERS == 1 and self.SPIKE_SERVERS == 1 and not self.AUTOSCALING and self.BATCHES == 0
+                and not self.AUTO_WARMUP and not self.SAMPLED_SERIES and self.SAMPLES_DIR is None and not self.TRACE)
+
+    def _run_replica(self, replica):
+        if self.KERNEL:
+            if not NUMBA_AVAILABLE:
+                _log_once("Simulator.KERNEL richiesto ma Numba non è installato: le repliche usano il motore a eventi")
+            elif not self._kernel_supported():
+                _log_once("Simulator.KERNEL non supporta questa configurazione: le repliche usano il motore a eventi")
+            else:
+                return self._run_replica_kernel(replica)
+        self.event_trace = None
+        if self.TRACE:
+            path = None
+            if self.TRACE_DIR is not None:
+                name = "_".join(str(value) for value in (self.seed,) + tuple(self.get_parameters()))
+                path = os.path.join(self.TRACE_DIR, f"trace_{name}_r{replica}.npy")
+            self.event_trace = EventTrace(self.TRACE_CAPACITY, path)
+        try:
+            return self._run_events(replica)
+        except Exception:
+            if self.event_trace is not None:
+                logging.error(f"Errore nella replica {replica}, ultimi eventi registrati:\n{EventTrace.format(self.event_trace.events()[-20:])}")
+            raise
+        finally:
+            if self.event_trace is not None:
+                self.event_trace.flush()
+
+    def _run_events(self, replica):
+        # Motore a eventi; self.event_trace è la traccia della replica o None
+        SI_max = self.SI_max
+        trace = self.event_trace
+        self._stream_usage = {}
+        if self.CRN:
+            self._replay_trace(self._get_trace(replica))
+        else:
+            self._plant_streams(replica)
+        t = Simulator.START
+        track = Track()
+        track_transient = Track()
+        t = Simulator.START
+        time_to_next_arrival = next(self._arrivals)
+        track.record_arrival(time_to_next_arrival)
+        jobs = JobStore(max(1024, 2 * SI_max))
+        # Gruppi di server con la politica di dispatch; power_of_d usa un generatore dedicato alla replica
+        dispatch_rng = np.random.default_rng([self.seed, replica])
+        web = ServerGroup(jobs, self.WEB_SERVERS, make_dispatcher(self.DISPATCH, self.DISPATCH_D, dispatch_rng))
+        spike = ServerGroup(jobs, self.SPIKE_SERVERS, make_dispatcher(self.DISPATCH, self.DISPATCH_D, dispatch_rng))
+        events = EVENT_LISTS[self.EVENT_LIST]()
+        autoscaler = None
+        if self.AUTOSCALING:
+            autoscaler = Autoscaler(spike, events, Simulator.BOOT, Simulator.IDLE_TIMEOUT, self.SPIKE_BOOT_TIME, self.SPIKE_IDLE_TIMEOUT,
+                                    self.SPIKE_MIN_INSTANCES, self.SCALE_UP_JOBS or SI_max, self.SCALE_UP_COOLDOWN)
+
+        # Serie campionate: il tempo di risposta cumulativo resta sempre in memoria per l'analisi del
+        # transitorio, le altre serie finiscono nei risultati oppure, con SAMPLES_DIR, solo su file
+        path = None
+        if self.SAMPLES_DIR is not None:
+            name = "_".join(str(value) for value in (self.seed,) + tuple(self.get_parameters()))
+            path = os.path.join(self.SAMPLES_DIR, f"samples_{name}_r{replica}.npy")
+        # Tempi di risposta dei singoli job dopo BIAS_PHASE, per server
+        histograms = {name: LogHistogram(self.SKETCH_ACCURACY) for name in ("web", "spike")}
+
+        sampler = Sampler(Simulator.SAMPLING_INTERVAL, Simulator.STOP, ("response_time",) + tuple(m for m in self.SAMPLED_SERIES if m != "response_time"),
+                          path=path, keep=("response_time",))
+
+        # Modalità batch means: contatori cumulativi ai confini dei batch di durata fissa tra BIAS_PHASE e STOP
+        if self.BATCHES > 0:
+            batch_length = (Simulator.STOP - Simulator.BIAS_PHASE) / self.BATCHES
+            next_batch = Simulator.BIAS_PHASE
+            batch_counters = []
+        else:
+            next_batch = Simulator.INFINITY
+            batch_counters = None
+
+        # Troncamento automatico: contatori cumulativi all'inizio di ogni finestra di WARMUP_INTERVAL secondi
+        if self.AUTO_WARMUP and self.BATCHES == 0:
+            next_window = Simulator.START
+            window_counters = []
+        else:
+            next_window = Simulator.INFINITY
+            window_counters = None
+        # Con il troncamento automatico i tempi di risposta restano in lista fino alla scelta del
+        # troncamento e negli istogrammi entrano solo quelli dei job completati dopo, come nei contatori
+        response_times = {name: [] for name in histograms} if window_counters is not None else None
+        add_response = {name: histograms[name].add if response_times is None else response_times[name].append for name in histograms}
+
+
+        # Gestori degli eventi per tipo: un nuovo tipo di evento si aggiunge qui senza toccare il ciclo
+        def reschedule(server, now):
+            # Il prossimo completamento di un server PS cambia ogni volta che cambia il numero di job;
+            # l'orologio virtuale del server è già aggiornato a now
+            if server.completion is not None:
+                events.cancel(server.completion)
+            server.completion = events.schedule(now + max(server.time_to_next_completion(), 0.0), Simulator.COMPLETION, server) if len(server) > 0 else None
+
+        def on_completion(event):
+            now = event.time
+            server = event.target
+            job = (spike if jobs.server[server.peek()] == JobStore.SPIKE else web).pop(server, now)
+            server.completion = None
+            if trace is not None:
+                trace.record(now, Simulator.COMPLETION, jobs.server[job], server.index, len(web), len(spike) + len(pending), job)
+            if jobs.server[job] == JobStore.WEB:
+                track_transient.completed_web += 1
+                if now > Simulator.BIAS_PHASE:
+                    track.completed_web += 1
+                    add_response["web"](now - jobs.arrival_time[job])
+            else:
+                track_transient.completed_spike += 1
+                if now > Simulator.BIAS_PHASE:
+                    track.completed_spike += 1
+                    add_response["spike"](now - jobs.arrival_time[job])
+            jobs.release(job)
+            reschedule(server, now)
+            if autoscaler is not None and jobs.server[job] == JobStore.SPIKE:
+                autoscaler.job_done(server.index, now)
+
+        def spike_server_for_job():
+            i = spike.dispatcher.select(spike.index, SI_max)
+            return spike.servers[i if i is not None else spike.index.argmin()]
+
+        def add_spike(server, job, now):
+            spike.add(server, job, now)
+            if autoscaler is not None:
+                autoscaler.job_added(server.index)
+            reschedule(server, now)
+
+        def on_arrival(event):
+            now = event.time
+            # Il dispatcher sceglie un web server; se ha già SI_max job il job va in overflow a uno
+            # spike server, scelto con la stessa politica (o il meno carico se sono tutti oltre SI_max)
+            i = web.dispatcher.select(web.index, SI_max)
+            is_spike = i is None
+            if is_spike:
+                if autoscaler is not None and autoscaler.needs_instance() and autoscaler.scale_up(now):
+                    track.scaling_actions += 1
+                server = spike_server_for_job()
+            else:
+                server = web.servers[i]
+            service_demand = next(self._services_spike) if is_spike else next(self._services_web)
+            new_job = jobs.alloc(now, service_demand, JobStore.SPIKE if is_spike else JobStore.WEB)
+            if is_spike:
+                track.record_service_spike(service_demand)
+                if autoscaler is None:
+                    if len(server) == 0:
+                        track.scaling_actions += 1
+                    add_spike(server, new_job, now)
+                elif spike.index.load(server.index) == float("inf"):
+                    autoscaler.pending.append(new_job)  # Nessuna istanza accesa, il job attende un avvio
+                    server = None
+                else:
+                    add_spike(server, new_job, now)
+            else:
+                web.add(server, new_job, now)
+                track.record_service_web(service_demand)
+                reschedule(server, now)
+            if trace is not None:
+                trace.record(now, Simulator.ARRIVAL, jobs.server[new_job], server.index if server is not None else -1, len(web), len(spike) + len(pending), new_job)
+            # Programmo il prossimo arrivo, gli arrivi si fermano dopo STOP
+            if now < Simulator.STOP:
+                interarrival = next(self._arrivals)
+                track.record_arrival(interarrival)
+                events.schedule(now + interarrival, Simulator.ARRIVAL)
+
+        def on_boot(event):
+            # Istanza pronta: riceve i job in attesa, distribuiti tra le istanze accese
+            autoscaler.on_boot(event.target, event.time)
+            while autoscaler.pending:
+                add_spike(spike_server_for_job(), autoscaler.pending.popleft(), event.time)
+            if trace is not None:
+                trace.record(event.time, Simulator.BOOT, JobStore.SPIKE, event.target, len(web), len(spike))
+
+        def on_idle_timeout(event):
+            autoscaler.on_idle(event.target, event.time)
+            if trace is not None:
+                trace.record(event.time, Simulator.IDLE_TIMEOUT, JobStore.SPIKE, event.target, len(web), len(spike) + len(pending))
+
+        control_last = [0.0, 0]     # Area e completamenti all'ultimo controllo
+        def on_control(event):
+            # Regola sul tempo di risposta medio dell'ultima finestra di controllo: mentre un'istanza è
+            # in avvio il tempo di risposta non ne riflette ancora la capacità, quindi non se ne avviano altre
+            area = track_transient.area_node_web + track_transient.area_node_spike
+            completed = track_transient.completed_web + track_transient.completed_spike
+            if completed > control_last[1] and (area - control_last[0]) / (completed - control_last[1]) > self.SCALE_UP_RESPONSE_TIME:
+                if autoscaler.booting == 0 and autoscaler.scale_up(event.time):
+                    track.scaling_actions += 1
+            control_last[:] = [area, completed]
+            if trace is not None:
+                trace.record(event.time, Simulator.CONTROL, -1, -1, len(web), len(spike) + len(pending))
+            if event.time < Simulator.STOP:
+                events.schedule(event.time + self.CONTROL_INTERVAL, Simulator.CONTROL)
+
+        handlers = {Simulator.COMPLETION: on_completion, Simulator.ARRIVAL: on_arrival, Simulator.BOOT: on_boot,
+                    Simulator.IDLE_TIMEOUT: on_idle_timeout, Simulator.CONTROL: on_control}
+        events.schedule(t + time_to_next_arrival, Simulator.ARRIVAL)
+        if autoscaler is not None and self.SCALE_UP_RESPONSE_TIME is not None:
+            events.schedule(t + self.CONTROL_INTERVAL, Simulator.CONTROL)
+        pending = autoscaler.pending if autoscaler is not None else ()
+
+        # Dopo STOP restano solo i job in sistema: i timer di spegnimento e controllo non allungano la simulazione
+        while len(events) > 0 and (t < Simulator.STOP or len(web) > 0 or len(spike) > 0 or len(pending) > 0):
+            event = events.pop()
+            time_to_next_event = event.time - t
+            n_web = len(web)
+            n_spike = len(spike) + len(pending)
+            # Frazione di server occupati, l'utilizzazione è la media sui server del gruppo
+            busy_web = web.busy / self.WEB_SERVERS
+            busy_spike = spike.busy / self.SPIKE_SERVERS
+
+            # Istanti di campionamento che cadono prima del prossimo evento, con lo stato attuale
+            if event.time > sampler.next_time:
+                sampler.record(t, time_to_next_event, n_web, n_spike, busy_web, busy_spike, track, track_transient, t >= Simulator.BIAS_PHASE)
+
+            # Confini di batch che cadono prima del prossimo evento: un solo intervallo può attraversarne
+            # più di uno. Le aree vengono portate fino al confine con lo stato attuale, l'ultimo confine è STOP
+            while event.time >= next_batch:
+                snapshot = track.counters()
                 if t >= Simulator.BIAS_PHASE:
-                    track.area_node_web += len(web_jobs) * time_to_next_event
-                    track.area_node_spike += len(spike_jobs) * time_to_next_event
-
-                    if len(web_jobs) > 0:
-                        track.area_busy_web += time_to_next_event
-                    if len(spike_jobs) > 0:
-                        track.area_busy_spike += time_to_next_event
-                track_transient.area_node_web += len(web_jobs) * time_to_next_event
-                track_transient.area_node_spike += len(spike_jobs) * time_to_next_event
-
-                # A questo punto aggiorno il tempo rimanente di lavoro per ogni job in servizio in base al tempo trascorso
-                for job in web_jobs:
-                    job.remaining_work -= time_to_next_event / len(web_jobs)  # Condivisione della CPU tra i job
-                for job in spike_jobs:
-                    job.remaining_work -= time_to_next_event / len(spike_jobs)  # Condivisione della CPU tra i job
-
-                # A questo punto processo l'evento
-                if min_work_web_job is not None and abs(time_to_complete_web - time_to_next_event) < 1e-8:
-                    # Completamento di un job, lo leviamo dalla lista 
-                    web_jobs.remove(min_work_web_job)
-                    logging.debug(f"Completed Web Job Arrival: {min_work_web_job.arrival_time}")
-
-                    # Aggiorno il tempo al prossimo arrivo
-                    time_to_next_arrival -= time_to_next_event
-                    
-                    # Aggiorno le statistiche
-                    if t > Simulator.BIAS_PHASE: 
-                        track.completed_web += 1
-                        #print(f"Completed Web Jobs: {track.completed_web}")
-                        #TODO
-                elif min_work_spike_job is not None and abs(time_to_complete_spike - time_to_next_event) < 1e-8:
-                    # Completamento di un job, lo leviamo dalla lista 
-                    spike_jobs.remove(min_work_spike_job)
-                    logging.debug(f"Completed Spike Job Arrival: {min_work_spike_job.arrival_time}")
-
-                    # Aggiorno il tempo al prossimo arrivo
-                    time_to_next_arrival -= time_to_next_event
-
-                    # Aggiorno le statistiche
-                    if t > Simulator.BIAS_PHASE: 
-                        track.completed_spike += 1
-                        #TODO
-                elif abs(time_to_next_event - time_to_next_arrival) < 1e-8:
-                    # Arrivo di un nuovo job
-                    is_spike = (len(web_jobs) >= SI_max)
-                    service_demand = self._GetServiceSpike(spike_stream) if is_spike else self._GetServiceWeb(web_stream)
-                    new_job = Simulator.Job(t, service_demand, is_spike)
-                    if is_spike:
-                        if len(spike_jobs) == 0:
-                            track.scaling_actions += 1
-                        spike_jobs.append(new_job)
-                        track.record_service_spike(service_demand)
-                    else:
-                        web_jobs.append(new_job)
-                        track.record_service_web(service_demand)
-                    logging.debug(f"New {'Spike' if is_spike else 'Web'} Job Arrival: {t}, Service Demand: {service_demand}")
-                    # Programmo il prossimo arrivo
-                    if t < Simulator.STOP:
-                        time_to_next_arrival = self._GetArrival(arrival_stream)
-                        track.record_arrival(time_to_next_arrival)
-                    else:
-                        time_to_next_arrival = Simulator.INFINITY
+                    elapsed = next_batch - t
+                    snapshot["area_node_web"] += n_web * elapsed
+                    snapshot["area_node_spike"] += n_spike * elapsed
+                    if n_web > 0:
+                        snapshot["area_busy_web"] += busy_web * elapsed
+                    if n_spike > 0:
+                        snapshot["area_busy_spike"] += busy_spike * elapsed
+                    snapshot["area_spike_instances"] += (autoscaler.instances if autoscaler is not None else spike.busy) * elapsed
+                batch_counters.append(snapshot)
+                if len(batch_counters) < self.BATCHES:
+                    next_batch = Simulator.BIAS_PHASE + len(batch_counters) * batch_length
                 else:
-                    # Nessun evento, dovrebbe essere impossibile
-                    raise Exception(f"Nessun evento trovato. \n \
-                                    Next Time Event: {time_to_next_event}, \n \
-                                    Arrival: {time_to_next_arrival}, \n \
-                                    Min Web: {time_to_complete_web if len(web_jobs) > 0 else Simulator.INFINITY}, \n \
-                                    Min Spike: {time_to_complete_spike if len(spike_jobs) > 0 else Simulator.INFINITY}")
-                
-                if t >= sample * Simulator.SAMPLING_INTERVAL:
-                    #print(f"Worker {worker_id} Sample {sample} at time {t} >= {sample * Simulator.SAMPLING_INTERVAL}")
-                    sample += 1
-                    transient_response_time = (track.area_node_web + track.area_node_spike) / (track.completed_web + track.completed_spike) if (track.completed_web + track.completed_spike) > 0 else 0.0
-                    #print(f"Transient Response Time: {transient_response_time}")
-                    #print(f"Completed Web: {track.completed_web}, Completed Spike: {track.completed_spike}")
-                    #print(f"Area Node Web: {track.area_node_web}, Area Node Spike: {track.area_node_spike}")
-                    track.transient_response_times.append(transient_response_time)
-
-                # Aggiorno il tempo corrente
-                t = t + time_to_next_event
-
-            if any(stream_usage > MODULUS / STREAMS for stream_usage in self._stream_usage.values()):
-                logging.warning("The use of the RNG stream has exceeded the maximum limit!")
-                arrival_stream = 4 * Simulator.N_PROCESSES + worker_id
-                web_stream = 5 * Simulator.N_PROCESSES + worker_id
-                spike_stream = 6 * Simulator.N_PROCESSES + worker_id
-                self._stream_usage = {}
+                    next_batch = Simulator.STOP if len(batch_counters) == self.BATCHES else Simulator.INFINITY
+
+            # Aggiorno le aree sotto le curve per calcolare le statistiche di utilizzo e numero di job.
+            # Gli orologi virtuali dei server vengono aggiornati solo quando un server viene toccato
+            if t >= Simulator.BIAS_PHASE:
+                track.area_node_web += n_web * time_to_next_event
+                track.area_node_spike += n_spike * time_to_next_event
+
+                if n_web > 0:
+                    track.area_busy_web += busy_web * time_to_next_event
+                if n_spike > 0:
+                    track.area_busy_spike += busy_spike * time_to_next_event
+                track.area_spike_instances += (autoscaler.instances if autoscaler is not None else spike.busy) * time_to_next_event
+            track_transient.area_node_web += n_web * time_to_next_event
+            track_transient.area_node_spike += n_spike * time_to_next_event
+            if n_web > 0:
+                track_transient.area_busy_web += busy_web * time_to_next_event
+            if n_spike > 0:
+                track_transient.area_busy_spike += busy_spike * time_to_next_event
+
+            # Aggiorno il tempo corrente e processo l'evento
+            t = event.time
+            handlers[event.kind](event)
+
+            while t >= next_window:
+                window_counters.append(track.counters())
+                next_window += Simulator.WARMUP_INTERVAL
+
+        if batch_counters is not None and len(batch_counters) <= self.BATCHES:
+            batch_counters.append(track.counters())     # Fine dell'ultimo batch
+
+        if any(stream_usage > Simulator.REPLICA_STRIDE for stream_usage in self._stream_usage.values()):
+            logging.warning(f"The use of the RNG stream has exceeded the maximum limit in replica {replica}!")
+
+        # # --- Risultati Finali ---
+        interval_time = t - Simulator.BIAS_PHASE
+        series = sampler.columns()
+        warmup_time = None
+        if window_counters is not None and len(window_counters) > 1:
+            # MSER-5 sul numero medio di job nel sistema per finestra (proporzionale al tempo di
+            # risposta per la legge di Little): scarto le finestre prima del troncamento
+            area = np.array([c["area_node_web"] + c["area_node_spike"] for c in window_counters])
+            d = Simulator.mser(np.diff(area) / Simulator.WARMUP_INTERVAL)
+            warmup_time = max(d * Simulator.WARMUP_INTERVAL, Simulator.BIAS_PHASE)
+            if d > 0:
+                base = window_counters[d]
+                track = Track.from_counters({key: value - base[key] for key, value in track.counters().items()})
+                interval_time = t - warmup_time
+                for name, values in response_times.items():
+                    del values[:base[f"completed_{name}"]]
+        if response_times is not None:
+            for name, values in response_times.items():
+                histograms[name].add_many(values)
+        replica_results = track.results(interval_time)
+        if warmup_time is not None:
+            replica_results["warmup_time"] = warmup_time
+        self._record_quantiles(replica_results, histograms)
+        replica_results["transient_response_times"] = series["response_time"].tolist()
+        if path is None:
+            for name in self.SAMPLED_SERIES:
+                replica_results[f"series_{name}"] = series[name].tolist()
+        if batch_counters is not None:
+            replica_results["batch_counters"] = batch_counters
+
+        return replica_results
+
+    def _record_quantiles(self, replica_results, histograms):
+        histograms["total"] = LogHistogram(self.SKETCH_ACCURACY).merge(histograms["web"]).merge(histograms["spike"])
+        for name, histogram in histograms.items():
+            for q in self.QUANTILES:
+                replica_results[f"{name}_response_time_p{round(100 * q)}"] = histogram.quantile(q)
+            replica_results[f"{name}_response_time_histogram"] = histogram.to_dict()
+
+    def _run_replica_kernel(self, replica):
+        # Stessa replica di _run_replica eseguita da kernel.run_replica. Le variate vengono prese dagli
+        # stessi generatori del motore a eventi, quindi con gli stessi stream i risultati coincidono;
+        # se un array si esaurisce lo allungo e rieseguo la replica da capo
+        if not NUMBA_AVAILABLE:
+            _log_once("Numba non è installato: il kernel viene eseguito come Python puro, senza compilazione")
+        self._stream_usage = {}
+        take = lambda variates, n: np.fromiter(itertools.islice(variates, n), dtype=np.float64, count=n)
+        if self.CRN:
+            trace = self._get_trace(replica)
+            arrivals = np.append(trace.interarrivals, Simulator.INFINITY)
+            web_units = spike_units = trace.service_units
+            web_scale, spike_scale = float(self.web_mean), float(self.spike_mean)
+        else:
+            self._plant_streams(replica)
+            n = int(1.1 * Simulator.STOP / self.arrival_mean) + 1
+            arrivals = take(self._arrivals, n)
+            web_units = take(self._services_web, n)
+            spike_units = take(self._services_spike, n // 4 + 1)
+            web_scale = spike_scale = 1.0
+        while True:
+            (status, counters, samples, n_samples, rt_web, n_web, rt_spike, n_spike, t, *_) = run_kernel(
+                arrivals, web_units, spike_units, web_scale, spike_scale, self.CRN, self.SI_max,
+                Simulator.START, Simulator.STOP, Simulator.BIAS_PHASE, Simulator.SAMPLING_INTERVAL)
+            if status == OK:
                 break
+            if self.CRN and status != NEED_ARRIVALS:
+                raise RuntimeError(f"La traccia della replica {replica} non ha abbastanza domande di servizio")
+            if status == NEED_ARRIVALS:
+                more = np.full(len(arrivals), Simulator.INFINITY) if self.CRN else take(self._arrivals, len(arrivals))
+                arrivals = np.concatenate((arrivals, more))
+            elif status == NEED_WEB:
+                web_units = np.concatenate((web_units, take(self._services_web, len(web_units))))
+            else:
+                spike_units = np.concatenate((spike_units, take(self._services_spike, len(spike_units))))
+
+        if any(stream_usage > Simulator.REPLICA_STRIDE for stream_usage in self._stream_usage.values()):
+            logging.warning(f"The use of the RNG stream has exceeded the maximum limit in replica {replica}!")
+
+        # Contatori con i tipi di Track (i conteggi restano interi)
+        defaults = Track().counters()
+        track = Track.from_counters({key: type(defaults[key])(value) for key, value in zip(COUNTERS, counters)})
+        replica_results = track.results(t - Simulator.BIAS_PHASE)
+        histograms = {name: LogHistogram(self.SKETCH_ACCURACY) for name in ("web", "spike")}
+        histograms["web"].add_many(rt_web[:n_web].tolist())
+        histograms["spike"].add_many(rt_spike[:n_spike].tolist())
+        self._record_quantiles(replica_results, histograms)
+        replica_results["transient_response_times"] = samples[:n_samples].tolist()
+        return replica_results
+
+@functools.lru_cache(maxsize=None)
+def _log_once(message):
+    # Messaggi informativi riportati una sola volta per processo
+    logging.info(message)
 
-            def calc_mean_cv(sum_val, sq_sum, count):
-                if count < 2: return 0.0, 0.0
-                mean = sum_val / count
-                variance = (sq_sum - (sum_val**2 / count)) / (count - 1)
-                std_dev = np.sqrt(variance) if variance > 0 else 0.0
-                cv = std_dev / mean if mean > 0 else 0.0
-                return mean, cv
-
-            meas_arr_mean, meas_arr_cv = calc_mean_cv(track.arr_sum, track.arr_sq_sum, track.arr_count)
-            meas_web_mean, meas_web_cv = calc_mean_cv(track.web_serv_sum, track.web_serv_sq_sum, track.web_serv_count)
-            meas_spike_mean, meas_spike_cv = calc_mean_cv(track.spike_serv_sum, track.spike_serv_sq_sum, track.spike_serv_count)
-
-            # # --- Risultati Finali ---
-            interval_time = t - Simulator.BIAS_PHASE
-            avg_interarrival = track.area_node_web / track.completed_web if track.completed_web > 0 else 0.0
-            total_jobs_completed = track.completed_web + track.completed_spike
-            avg_response_time_web = track.area_node_web / track.completed_web if track.completed_web > 0 else None
-            avg_response_time_spike = track.area_node_spike / track.completed_spike if track.completed_spike > 0 else None
-            avg_response_time_total = (track.area_node_web + track.area_node_spike) / total_jobs_completed if total_jobs_completed > 0 else None
-            utilization_web = track.area_busy_web / interval_time
-            utilization_spike = track.area_busy_spike / interval_time
-            throughput_web = track.completed_web / interval_time
-            throughput_spike = track.completed_spike / interval_time
-            throughput_total = total_jobs_completed / interval_time
-            
-
-            replica_results = {
-                "web_response_time": avg_response_time_web,
-                "spike_response_time": avg_response_time_spike,
-                "total_response_time": avg_response_time_total,
-                "utilization_web": utilization_web,
-                "utilization_spike": utilization_spike,
-                "throughput_web": throughput_web,
-                "throughput_spike": throughput_spike,
-                "throughput_total": throughput_total,
-                "scaling_actions": track.scaling_actions,
-                "meas_arrival_mean": meas_arr_mean,
-                "meas_arrival_cv": meas_arr_cv,
-                "meas_web_service_mean": meas_web_mean,
-                "meas_web_service_cv": meas_web_cv,
-                "meas_spike_service_mean": meas_spike_mean,
-                "meas_spike_service_cv": meas_spike_cv,
-                "transient_response_times": track.transient_response_times
-            }
-
-            queue_output.put(replica_results)
-            input_replica = queue_input.get()
-            logging.debug(f"Queue Input Replica: {input_replica}")
-        logging.debug(f"Worker {worker_id} terminato con stream usage {self._stream_usage}.")
+# Funzione eseguita dai worker del pool: ogni processo tiene un proprio Simulator
+# e lo riconfigura per ogni blocco di repliche ricevuto. Le repliche vengono aggregate
+# nel worker e al processo principale arriva solo il riassunto (n, media e M2 per metrica
+# e per istante di campionamento), più pid e tempo di lavoro per il report sul carico.
+# Con raw=True vengono restituiti anche i risultati delle singole repliche
+_worker_simulator = None
+
+def _attach_shared(name):
+    # Il segmento appartiene al processo principale: solo lui chiama unlink(), che lo toglie anche
+    # dal resource tracker. Con fork il worker eredita il tracker del processo principale, perché
+    # get_pool() lo avvia prima di creare i worker, e la registrazione ripetuta all'apertura è innocua,
+    # quindi non va annullata (unregister dal worker cancellerebbe la voce del processo principale);
+    # con spawn e forkserver il worker annulla la propria registrazione per non rimuovere il segmento
+    # alla sua uscita
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)   # Python >= 3.13
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if multiprocessing.get_start_method(allow_none=True) not in (None, "fork"):
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+def _write_series(shm, rows, num_samples, row, result):
+    values = result["transient_response_times"][:num_samples]
+    np.ndarray((rows, num_samples), dtype=np.float64, buffer=shm.buf)[row, :len(values)] = values
+
+def _without_series(result):
+    return {key: value for key, value in result.items() if key != "transient_response_times"}
+
+def _simulate_replicas(config, replicas, num_samples, raw=False, target=None):
+    # target = (nome della memoria condivisa, righe, riga di ogni replica) per le serie transitorie
+    global _worker_simulator
+    start = time.perf_counter()
+    if _worker_simulator is None:
+        _worker_simulator = Simulator()
+    _worker_simulator.configure(config)
+    shm = _attach_shared(target[0]) if target is not None else None
+    summary = {}
+    results = [] if raw else None
+    try:
+        for i, replica in enumerate(replicas):
+            result = _worker_simulator._run_replica(replica)
+            if shm is not None:
+                _write_series(shm, target[1], num_samples, target[2][i], result)
+                Simulator._record_result(summary, _without_series(result), num_samples)
+            else:
+                Simulator._record_result(summary, result, num_samples)
+            if raw:
+                results.append(_without_series(result) if shm is not None else result)
+    finally:
+        if shm is not None:
+            shm.close()
+    return os.getpid(), time.perf_counter() - start, len(replicas), summary, results
+
+def testKernel(replicas=3):
+    # Il kernel deve dare esattamente i risultati del motore a eventi, con stream indipendenti e con CRN.
+    # Senza Numba il kernel gira come Python puro: il confronto verifica comunque la logica
+    sim = Simulator()
+    sim.KERNEL = False
+    for crn in (False, True):
+        sim.CRN = crn
+        for replica in range(replicas):
+            expected = sim._run_replica(replica)
+            result = sim._run_replica_kernel(replica)
+            if result != expected:
+                different = [key for key in expected if result.get(key) != expected[key]]
+                print(f"ERROR - kernel diverso dal motore a eventi (crn={crn}, replica={replica}): {different}")
+                return False
+    print("Kernel OK")
+    return True
 
 if __name__ == "__main__":
     sim = Simulator()
     parameters, stats = sim.run()
+    Simulator.log_worker_report()
     logging.info("Simulazione completata con i seguenti parametri:")
     SI_max, arrival_mean, web_mean, spike_mean, cv = parameters
     logging.info(f"  SI_max: {SI_max}")
@@ -414,6 +1166,13 @@ if __name__ == "__main__":
     logging.info(f"  Coefficiente di Variazione: {cv}")
     logging.info("Statistiche raccolte con intervallo di confidenza al 95%:")
     for metric, w in stats.items():
+        if isinstance(w, LogHistogram):
+            # Quantili dei tempi di risposta di tutti i job, come in compose_row
+            quantiles = ", ".join(f"p{round(100 * q)}={w.quantile(q):.4f}" for q in Simulator.QUANTILES)
+            logging.info(f"{metric:<25}: {quantiles}")
+            continue
+        if isinstance(w, WelfordStatsArray):
+            continue    # Serie per istante di campionamento
         mean = w.mean
         ci = w.confidence_interval_95()
         logging.info(f"{metric:<25}: {mean:.4f} +/- {ci:.4f} (Var: {w.variance:.6f})")
\ No newline at end of file
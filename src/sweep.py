@@ -0,0 +1,53 @@
+from sim import Simulator
+import itertools
+import logging
+
+# Assi ammessi nella specifica della griglia: ogni asse imposta un attributo del Simulator,
+# arrival_rate (req/s) viene convertito nel tempo medio di interarrivo
+AXES = ("seed", "SI_max", "arrival_rate", "arrival_mean", "web_mean", "spike_mean", "cv")
+
+def grid(**axes):
+    # Prodotto cartesiano degli assi nell'ordine in cui sono dati (il primo è il ciclo più esterno),
+    # es. grid(SI_max=range(10, 170, 10), arrival_rate=range(1, 13))
+    for name in axes:
+        if name not in AXES:
+            raise ValueError(f"Asse sconosciuto '{name}', ammessi: {', '.join(AXES)}")
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(list(v) for v in axes.values()))]
+
+def apply_point(simulator : Simulator, point):
+    for name, value in point.items():
+        if name == "arrival_rate":
+            simulator.arrival_mean = 1.0 / value
+        else:
+            setattr(simulator, name, value)
+
+def _expected_cost(simulator : Simulator, point):
+    # Il costo di una replica cresce con il numero di arrivi in STOP secondi
+    arrival_mean = 1.0 / point["arrival_rate"] if "arrival_rate" in point else point.get("arrival_mean", simulator.arrival_mean)
+    return Simulator.STOP / arrival_mean
+
+def sweep(simulator : Simulator, points, processes=None):
+    # Esegue tutti i punti della griglia, con tutte le repliche, come un unico insieme di task sul pool.
+    # I punti vengono inviati dal più costoso al meno costoso, così le repliche lunghe non restano
+    # in coda alla fine. I risultati sono prodotti nell'ordine della griglia come (punto, params, stats)
+    # appena ciascun punto è stato raccolto, così chi li consuma può salvarli man mano
+    if processes is not None:
+        Simulator.N_PROCESSES = processes
+    saved_seed, saved_parameters = simulator.seed, simulator.get_parameters()
+    Simulator.reset_worker_report()
+
+    pending = [None] * len(points)
+    order = sorted(range(len(points)), key=lambda i: _expected_cost(simulator, points[i]), reverse=True)
+    for i in order:
+        apply_point(simulator, points[i])
+        pending[i] = simulator.submit()
+    logging.info(f"Inviati {len(points)} punti della griglia x {simulator.REPLICAS} repliche al pool")
+
+    simulator.seed = saved_seed
+    simulator.set_parameters(*saved_parameters)
+
+    for point, p in zip(points, pending):
+        params, stats = Simulator.collect(p)
+        yield point, params, stats
+    Simulator.log_worker_report()
@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 class WelfordStats:
     def __init__(self):
@@ -13,6 +14,32 @@ class WelfordStats:
         delta2 = x - self.mean
         self.M2 += delta * delta2
 
+    def update_many(self, values):
+        # Aggiornamento in blocco da un array: statistiche del blocco calcolate con NumPy e poi unite
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return self
+        block = WelfordStats()
+        block.n = len(values)
+        block.mean = float(values.mean())
+        block.M2 = float(((values - block.mean) ** 2).sum())
+        return self.merge(block)
+
+    def merge(self, other):
+        # Formula parallela di Chan et al.: unisce un altro accumulatore come se i suoi valori
+        # fossero stati passati a update() su questo
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.M2 = other.n, other.mean, other.M2
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.M2 += other.M2 + delta * delta * self.n * other.n / n
+        self.n = n
+        return self
+
     @property
     def variance(self):
         if self.n < 2:
@@ -29,4 +56,66 @@ class WelfordStats:
         if self.n < 2:
             return 0.0
         se = self.std_dev / math.sqrt(self.n) # Errore Standard
-        return 1.96 * se
\ No newline at end of file
+        return 1.96 * se
+
+class WelfordStatsArray:
+    # Array di accumulatori di Welford indipendenti, uno per slot (es. un istante di campionamento
+    # dei tempi di risposta transitori), aggiornati tutti insieme con operazioni vettoriali.
+    # L'indicizzazione e l'iterazione restituiscono WelfordStats, come una lista di accumulatori.
+    def __init__(self, size):
+        self.n = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.M2 = np.zeros(size)
+
+    def __len__(self):
+        return len(self.n)
+
+    def __getitem__(self, idx):
+        w = WelfordStats()
+        w.n, w.mean, w.M2 = int(self.n[idx]), float(self.mean[idx]), float(self.M2[idx])
+        return w
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    @staticmethod
+    def from_array(values):
+        # Accumulatori da una matrice (osservazioni, slot) in un colpo solo; NaN indica un valore mancante
+        values = np.asarray(values, dtype=float)
+        acc = WelfordStatsArray(values.shape[1])
+        valid = ~np.isnan(values)
+        acc.n = valid.sum(axis=0)
+        acc.mean = np.where(valid, values, 0.0).sum(axis=0) / np.maximum(acc.n, 1)
+        acc.M2 = np.where(valid, (values - acc.mean) ** 2, 0.0).sum(axis=0)
+        return acc
+
+    def update(self, values):
+        # Un valore per slot; se values è più corto aggiorna solo i primi slot, se più lungo viene troncato
+        values = np.asarray(values, dtype=float)[:len(self)]
+        k = len(values)
+        self.n[:k] += 1
+        delta = values - self.mean[:k]
+        self.mean[:k] += delta / self.n[:k]
+        delta2 = values - self.mean[:k]
+        self.M2[:k] += delta * delta2
+
+    def merge(self, other):
+        # Formula di Chan slot per slot
+        n = self.n + other.n
+        safe_n = np.maximum(n, 1)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / safe_n
+        self.M2 = self.M2 + other.M2 + delta * delta * self.n * other.n / safe_n
+        self.n = n
+        return self
+
+    @property
+    def variance(self):
+        return np.where(self.n > 1, self.M2 / np.maximum(self.n - 1, 1), 0.0)
+
+    @property
+    def std_dev(self):
+        return np.sqrt(self.variance)
+
+    def confidence_interval_95(self):
+        return np.where(self.n > 1, 1.96 * self.std_dev / np.sqrt(np.maximum(self.n, 1)), 0.0)